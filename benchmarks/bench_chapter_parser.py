@@ -0,0 +1,85 @@
+"""
+章节标题解析基准测试：在 10 万行的小说上对比旧版（每行完整正则 + 排序时每次比较两次 re.findall）
+与新版 chapter_parser（前缀检查 + 单次解析出编号）。
+
+用法：python benchmarks/bench_chapter_parser.py [--lines 100000] [--repeat 5]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chapter_parser import parse_chapter_header  # noqa: E402
+
+LEGACY_PATTERN = re.compile(r"(^[\s\u3000]*第[\s\u3000]*(?:\d+|一|二|三|四|五|六|七|八|九|十)[\s\u3000]*章[\s\u3000]*(.*)?$|^第(\d+|[一二三四五六七八九十]+)章)")
+CHINESE_NUMBERS = ["一", "二", "三", "四", "五", "六", "七", "八", "九", "十", "十一", "二十三", "一百", "一百零五"]
+
+
+def build_lines(line_count):
+    """生成测试用的小说行：每 50 行一个章节标题，阿拉伯数字与中文数字交替"""
+    lines = []
+    number = 1
+    for i in range(line_count):
+        if i % 50 == 0:
+            if number % 2:
+                lines.append(f"第{number}章 山雨欲来\n")
+            else:
+                lines.append(f"第{CHINESE_NUMBERS[number % len(CHINESE_NUMBERS)]}章 风满楼\n")
+            number += 1
+        else:
+            lines.append("他抬头望向远方，第一缕晨光正照在城墙上，守卫们换班的脚步声此起彼伏。\n")
+    return lines
+
+
+def legacy_extract(lines):
+    """旧版：逐行完整正则匹配，排序键每次调用 re.findall 两次"""
+    chapters = []
+    for i, line in enumerate(lines):
+        if LEGACY_PATTERN.search(line):
+            chapters.append({"title": line.strip(), "start_line": i})
+    chapters.sort(key=lambda ch: int(re.findall(r"\d+", ch["title"])[0]) if re.findall(r"\d+", ch["title"]) else 0)
+    return chapters
+
+
+def current_extract(lines):
+    """新版：前缀检查后解析，编号只计算一次"""
+    chapters = []
+    for i, line in enumerate(lines):
+        header = parse_chapter_header(line)
+        if header:
+            chapters.append({"title": header.title, "number": header.number, "start_line": i})
+    chapters.sort(key=lambda ch: ch["number"])
+    return chapters
+
+
+def best_time(func, lines, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(lines)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="章节标题解析基准测试")
+    parser.add_argument("--lines", type=int, default=100000, help="测试小说的行数")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数，取最短耗时")
+    args = parser.parse_args()
+
+    lines = build_lines(args.lines)
+    legacy, legacy_chapters = best_time(legacy_extract, lines, args.repeat)
+    current, current_chapters = best_time(current_extract, lines, args.repeat)
+    unparsed = sum(1 for ch in legacy_chapters if not re.findall(r"\d+", ch["title"]))
+
+    print(f"行数: {args.lines}")
+    print(f"旧版: {legacy * 1000:.1f} ms，识别 {len(legacy_chapters)} 章，其中 {unparsed} 章无法解析编号（按 0 排序）")
+    print(f"新版: {current * 1000:.1f} ms，识别 {len(current_chapters)} 章")
+    print(f"加速比: {legacy / current:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+编码检测与转码基准测试：对比旧版 convert_to_utf8（整文件 chardet.detect + 整文件读写）
+与新版（UTF-8 快速路径 + 样本增量检测 + 流式转码）。
+
+用法：python benchmarks/bench_encoding.py [--size-mb 20] [--repeat 3]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import chardet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from file_utils import convert_to_utf8  # noqa: E402
+
+
+def legacy_convert_to_utf8(file_path, output_path=None):
+    """旧版实现：整文件检测编码，再整文件解码和写入"""
+    with open(file_path, "rb") as f:
+        raw_data = f.read()
+        detected_encoding = chardet.detect(raw_data)['encoding']
+
+    if not detected_encoding:
+        raise ValueError(f"无法检测 {file_path} 的编码格式")
+
+    with open(file_path, "r", encoding=detected_encoding, errors="ignore") as f:
+        content = f.read()
+
+    if output_path is None:
+        output_path = file_path
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def build_text(size_bytes):
+    """生成大约 size_bytes 字节（UTF-8 计）的中文小说文本"""
+    paragraph = "天色渐晚，他推开窗，看见远处的山峦在暮色中起伏，心中不由得想起了故乡的那条小河。\n"
+    chapters = []
+    total = 0
+    number = 1
+    while total < size_bytes:
+        chapter = f"第{number}章 归途\n" + paragraph * 60
+        chapters.append(chapter)
+        total += len(chapter.encode("utf-8"))
+        number += 1
+    return "".join(chapters)
+
+
+def write_corpus(folder, size_bytes):
+    """写出 GBK、GB18030 和 UTF-8-BOM 三种编码的测试文件"""
+    text = build_text(size_bytes)
+    corpus = {}
+    for name, encoding in (("gbk", "gbk"), ("gb18030", "gb18030"), ("utf8-bom", "utf-8-sig")):
+        path = os.path.join(folder, f"{name}.txt")
+        with open(path, "w", encoding=encoding) as f:
+            f.write(text)
+        corpus[name] = path
+    return corpus
+
+
+def time_convert(func, source_path, work_path, repeat):
+    """多次复制源文件并转码，返回最短耗时"""
+    best = None
+    for _ in range(repeat):
+        shutil.copyfile(source_path, work_path)
+        start = time.perf_counter()
+        func(work_path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="编码检测与转码基准测试")
+    parser.add_argument("--size-mb", type=float, default=20, help="每个测试文件的大小（MB）")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，取最短耗时")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        corpus = write_corpus(folder, int(args.size_mb * 1024 * 1024))
+        work_path = os.path.join(folder, "work.txt")
+
+        print(f"{'语料':<10}{'大小(MB)':>10}{'旧版(s)':>10}{'新版(s)':>10}{'加速比':>8}")
+        for name, path in corpus.items():
+            size_mb = os.path.getsize(path) / 1024 / 1024
+            legacy = time_convert(legacy_convert_to_utf8, path, work_path, args.repeat)
+            current = time_convert(convert_to_utf8, path, work_path, args.repeat)
+            print(f"{name:<10}{size_mb:>10.1f}{legacy:>10.3f}{current:>10.3f}{legacy / current:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+合并流程基准测试：生成合成语料后依次测量 compute_md5、convert_to_utf8、extract_chapters、导入、
+打开工程（load_project）、合并（完整与增量）以及脱离 Tk 的界面逻辑（章节列表、章节读取、列表刷新）。
+每个阶段在独立的子进程中运行，记录耗时、吞吐量和峰值内存（RSS，包含该阶段启动的工作进程）。
+
+用法：python benchmarks/bench_pipeline.py [--count 200] [--size-kb 256] [--jobs 4]
+                                          [--output result.json] [--baseline old.json] [--tolerance 0.2]
+      语料参数见 benchmarks/corpus.py；--corpus 可指定已有的语料文件夹。
+指定 --baseline 时与之前保存的结果比较，任一阶段耗时或峰值内存超出容差即以退出码 1 结束，便于发现性能回退。
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from corpus import generate_corpus, add_corpus_arguments  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """当前进程及已结束子进程中的最大峰值 RSS（MB），不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024  # macOS 以字节计，Linux 以 KB 计
+
+
+def list_files(folder):
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".txt"))
+
+
+def total_bytes(paths):
+    return sum(os.path.getsize(p) for p in paths)
+
+
+class MemoryTree:
+    """只在内存中记录条目的 Treeview 替身，用于在没有显示器时测量列表刷新逻辑本身的耗时"""
+
+    def __init__(self):
+        self.order = []
+        self.texts = {}
+
+    def get_children(self):
+        return tuple(self.order)
+
+    def delete(self, *iids):
+        removed = set(iids)
+        self.order = [iid for iid in self.order if iid not in removed]
+        for iid in iids:
+            del self.texts[iid]
+
+    def insert(self, parent, index, iid, text=""):
+        self.order.insert(len(self.order) if index == "end" else index, iid)
+        self.texts[iid] = text
+
+    def item(self, iid, option=None, **kwargs):
+        if "text" in kwargs:
+            self.texts[iid] = kwargs["text"]
+        return self.texts[iid] if option == "text" else None
+
+    def move(self, iid, parent, index):
+        self.order.remove(iid)
+        self.order.insert(index, iid)
+
+
+def stage_compute_md5(ctx):
+    from file_utils import compute_md5
+
+    paths = list_files(ctx["corpus"])
+    for path in paths:
+        compute_md5(path)
+    return {"bytes": total_bytes(paths), "items": len(paths)}
+
+
+def stage_convert_to_utf8(ctx):
+    from file_utils import convert_to_utf8
+
+    paths = list_files(ctx["corpus"])
+    os.makedirs(ctx["utf8"], exist_ok=True)
+    for path in paths:
+        convert_to_utf8(path, os.path.join(ctx["utf8"], os.path.basename(path)))
+    return {"bytes": total_bytes(paths), "items": len(paths)}
+
+
+def stage_extract_chapters(ctx):
+    from file_utils import extract_chapters
+
+    paths = list_files(ctx["utf8"])
+    chapters = sum(len(extract_chapters(path)) for path in paths)
+    return {"bytes": total_bytes(paths), "items": len(paths), "chapters": chapters}
+
+
+def stage_import(ctx):
+    from project_manager import ProjectManager
+    from import_pipeline import import_novels
+
+    shutil.rmtree(ctx["project"], ignore_errors=True)
+    os.makedirs(os.path.join(ctx["project"], "novels"))
+    project_manager = ProjectManager(ctx["project"], backend=ctx["backend"])
+    paths = list_files(ctx["corpus"])
+    summary = import_novels(project_manager, paths, jobs=ctx["jobs"])
+    return {"bytes": total_bytes(paths), "items": len(summary["added"]), "failed": len(summary["failed"])}
+
+
+def stage_load_project(ctx):
+    from project_manager import ProjectManager
+
+    best = None
+    for _ in range(5):
+        start = time.perf_counter()
+        project_manager = ProjectManager(ctx["project"])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {"items": len(project_manager.get_novels()), "seconds": best}  # 取 5 次中最短的一次
+
+
+def stage_merge(ctx):
+    from project_manager import ProjectManager
+    from merge_engine import merge_novel_files
+
+    project_manager = ProjectManager(ctx["project"])
+    novels = project_manager.get_merge_order()
+    chapters = merge_novel_files(novels, project_manager.get_merge_output_path(), incremental=False, jobs=ctx["jobs"])
+    return {"bytes": total_bytes([n.path for n in novels]), "items": len(novels), "chapters": chapters}
+
+
+def stage_merge_incremental(ctx):
+    from project_manager import ProjectManager
+    from merge_engine import merge_novel_files
+
+    project_manager = ProjectManager(ctx["project"])
+    novels = project_manager.get_merge_order()
+    chapters = merge_novel_files(novels, project_manager.get_merge_output_path(), incremental=True, jobs=ctx["jobs"])
+    return {"bytes": os.path.getsize(project_manager.get_merge_output_path()), "items": len(novels), "chapters": chapters}
+
+
+def stage_gui_logic(ctx):
+    """界面操作中与 Tk 无关的部分：刷新小说列表、点击小说取章节列表、点击章节读取正文"""
+    try:
+        from lazy_views import sync_tree_items
+    except ImportError as e:  # 没有 tkinter 时跳过
+        return {"skipped": str(e)}
+    from project_manager import ProjectManager
+    from file_utils import read_chapter
+
+    project_manager = ProjectManager(ctx["project"])
+    novels = project_manager.get_novels()
+    tree = MemoryTree()
+    sync_tree_items(tree, [(n.name, n.name) for n in novels])
+    sync_tree_items(tree, [(n.name, n.name) for n in novels[1:]])  # 删除一本后的增量刷新
+
+    rng = random.Random(1)
+    read = 0
+    reads = 0
+    for novel in novels:
+        chapters = project_manager.get_chapters(novel)
+        if chapters:
+            read += len(read_chapter(novel.path, rng.choice(chapters)).encode("utf-8"))
+            reads += 1
+    return {"bytes": read, "items": reads}
+
+
+STAGES = [
+    ("compute_md5", stage_compute_md5),
+    ("convert_to_utf8", stage_convert_to_utf8),
+    ("extract_chapters", stage_extract_chapters),
+    ("import", stage_import),
+    ("load_project", stage_load_project),
+    ("merge", stage_merge),
+    ("merge_incremental", stage_merge_incremental),
+    ("gui_logic", stage_gui_logic),
+]
+
+
+def run_stage(name, ctx):
+    """在子进程中执行：运行一个阶段并返回耗时、吞吐量和峰值内存"""
+    func = dict(STAGES)[name]
+    start = time.perf_counter()
+    result = func(ctx)
+    result.setdefault("seconds", time.perf_counter() - start)
+    result["peak_rss_mb"] = peak_rss_mb()
+    seconds = result["seconds"] or 1e-9
+    if result.get("bytes"):
+        result["mb_per_s"] = result["bytes"] / 1024 / 1024 / seconds
+    if result.get("items"):
+        result["items_per_s"] = result["items"] / seconds
+    return result
+
+
+def run_isolated(name, ctx):
+    """每个阶段使用新的 spawn 子进程，使峰值内存互不影响"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(run_stage, name, ctx).result()
+
+
+def format_row(name, result):
+    if "skipped" in result:
+        return f"{name:<18} 跳过: {result['skipped']}"
+    rss = f"{result['peak_rss_mb']:8.1f}" if result.get("peak_rss_mb") is not None else "       -"
+    mb_per_s = f"{result['mb_per_s']:9.1f}" if "mb_per_s" in result else "        -"
+    items_per_s = f"{result['items_per_s']:9.1f}" if "items_per_s" in result else "        -"
+    return f"{name:<18} {result['seconds'] * 1000:10.1f} {mb_per_s} {items_per_s} {rss}"
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """返回超出容差的阶段说明列表"""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("stages", {}).get(name)
+        if not old or "skipped" in result or "skipped" in old:
+            continue
+        if result["seconds"] > old["seconds"] * (1 + tolerance):
+            regressions.append(f"{name}: 耗时 {old['seconds'] * 1000:.1f} ms -> {result['seconds'] * 1000:.1f} ms")
+        if result.get("peak_rss_mb") and old.get("peak_rss_mb") and result["peak_rss_mb"] > old["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: 峰值内存 {old['peak_rss_mb']:.1f} MB -> {result['peak_rss_mb']:.1f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合并流程基准测试")
+    add_corpus_arguments(parser)
+    parser.add_argument("--corpus", help="使用已有的语料文件夹（不再生成）")
+    parser.add_argument("--jobs", type=int, default=None, help="导入与合并的工作进程数")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json", help="工程存储类型")
+    parser.add_argument("--stages", help="只运行指定阶段，逗号分隔（后面的阶段依赖前面阶段的输出）")
+    parser.add_argument("--output", help="将结果保存为 JSON")
+    parser.add_argument("--baseline", help="与之前保存的结果比较")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的回退比例（默认 20%%）")
+    parser.add_argument("--keep", action="store_true", help="保留临时工作文件夹")
+    args = parser.parse_args()
+
+    work_folder = tempfile.mkdtemp(prefix="novel-bench-")
+    ctx = {
+        "corpus": args.corpus or os.path.join(work_folder, "corpus"),
+        "utf8": os.path.join(work_folder, "utf8"),
+        "project": os.path.join(work_folder, "project"),
+        "jobs": args.jobs,
+        "backend": args.backend,
+    }
+    selected = set(args.stages.split(",")) if args.stages else None
+    try:
+        if not args.corpus:
+            start = time.perf_counter()
+            generate_corpus(ctx["corpus"], args.count, args.size_kb, args.gbk_ratio, args.numerals, args.styles, args.seed)
+            print(f"生成语料: {args.count} 本，{total_bytes(list_files(ctx['corpus'])) / 1024 / 1024:.1f} MB，"
+                  f"{time.perf_counter() - start:.1f} s")
+
+        print(f"{'阶段':<16} {'耗时(ms)':>10} {'MB/s':>9} {'条/s':>9} {'峰值MB':>8}")
+        results = {}
+        for name, _ in STAGES:
+            if selected and name not in selected:
+                continue
+            results[name] = run_isolated(name, ctx)
+            print(format_row(name, results[name]), flush=True)
+    finally:
+        if args.keep:
+            print(f"工作文件夹: {work_folder}")
+        else:
+            shutil.rmtree(work_folder, ignore_errors=True)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "keep")},
+        "stages": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"性能回退 {line}")
+        if regressions:
+            return 1
+        print("与基准相比没有超出容差的回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+合成小说语料生成器：按给定数量、大小、编码比例（GBK/UTF-8）、章节标题样式和数字写法生成可复现的测试小说。
+
+用法：python benchmarks/corpus.py <输出文件夹> [--count 200] [--size-kb 256] [--gbk-ratio 0.5]
+                                 [--numerals arabic,chinese,fullwidth] [--styles plain,indent,colon] [--seed 1]
+"""
+import os
+import random
+import argparse
+
+CHINESE_DIGITS = "零一二三四五六七八九"
+FULLWIDTH_DIGITS = str.maketrans("0123456789", "０１２３４５６７８９")
+NUMERAL_FORMS = ("arabic", "chinese", "fullwidth")
+HEADING_STYLES = ("plain", "indent", "colon", "nospace")
+
+CHAPTER_NAMES = ["山雨欲来", "风满楼", "归途", "夜宴", "旧友重逢", "初雪", "渡口", "长亭外", "灯火", "残局"]
+SENTENCES = [
+    "天色渐晚，他推开窗，看见远处的山峦在暮色中起伏。",
+    "守卫们换班的脚步声此起彼伏，城墙上的火把被风吹得忽明忽暗。",
+    "她把信折好，压在砚台下面，转身去灶间烧水。",
+    "第二天清晨，雾气还没有散，码头上已经挤满了等船的人。",  # 以“第”开头但不是章节标题
+    "掌柜的拨了拨算盘，抬头看了一眼门口的客人，又低下头去。",
+    "雨下了整整一夜，院子里的石榴花落了一地。",
+]
+
+
+def chinese_numeral(number):
+    """把整数写成中文数字（支持到 99999）"""
+    if number == 0:
+        return CHINESE_DIGITS[0]
+    units = [(10000, "万"), (1000, "千"), (100, "百"), (10, "十")]
+    result = ""
+    zero = False
+    for value, unit in units:
+        digit, number = divmod(number, value)
+        if digit:
+            if zero:
+                result += CHINESE_DIGITS[0]
+            if not (unit == "十" and digit == 1 and not result):  # “十二”而不是“一十二”
+                result += CHINESE_DIGITS[digit]
+            result += unit
+            zero = False
+        elif result:
+            zero = True
+    if number:
+        if zero:
+            result += CHINESE_DIGITS[0]
+        result += CHINESE_DIGITS[number]
+    return result
+
+
+def format_number(number, form):
+    if form == "chinese":
+        return chinese_numeral(number)
+    if form == "fullwidth":
+        return str(number).translate(FULLWIDTH_DIGITS)
+    return str(number)
+
+
+def format_heading(number, name, form, style):
+    """生成一行章节标题"""
+    numeral = format_number(number, form)
+    if style == "indent":
+        return f"　　第{numeral}章　{name}"
+    if style == "colon":
+        return f"第{numeral}章：{name}"
+    if style == "nospace":
+        return f"第{numeral}章{name}"
+    return f"第{numeral}章 {name}"
+
+
+def generate_novel(rng, target_bytes, numerals, styles):
+    """生成一本小说的文本，约 target_bytes 字节（按 UTF-8 计），章节编号从 1 开始连续"""
+    form = rng.choice(numerals)
+    style = rng.choice(styles)
+    lines = ["序", rng.choice(SENTENCES)]  # 第一章之前的内容，合并时会被丢弃
+    size = 0
+    number = 1
+    while size < target_bytes:
+        heading = format_heading(number, rng.choice(CHAPTER_NAMES), form, style)
+        body = [rng.choice(SENTENCES) * rng.randint(1, 4) for _ in range(rng.randint(20, 60))]
+        lines.append(heading)
+        lines.extend(body)
+        size += len(heading.encode("utf-8")) + sum(len(line.encode("utf-8")) + 1 for line in body)
+        number += 1
+    return "\n".join(lines) + "\n"
+
+
+def generate_corpus(folder, count=200, size_kb=256, gbk_ratio=0.5, numerals=NUMERAL_FORMS, styles=HEADING_STYLES, seed=1):
+    """
+    在 folder 中生成 count 本小说。相同参数和 seed 生成的语料逐字节相同。
+
+    :param size_kb: 平均大小（KB），每本在 50%～150% 之间随机
+    :param gbk_ratio: 以 GBK 编码保存的比例，其余为 UTF-8
+    :return: 生成的文件路径列表
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        target = int(size_kb * 1024 * rng.uniform(0.5, 1.5))
+        text = generate_novel(rng, target, numerals, styles)
+        encoding = "gbk" if rng.random() < gbk_ratio else "utf-8"
+        path = os.path.join(folder, f"小说 {i:05d}.txt")
+        with open(path, "wb") as f:
+            f.write(text.encode(encoding))
+        paths.append(path)
+    return paths
+
+
+def parse_choices(value, allowed):
+    choices = tuple(v.strip() for v in value.split(",") if v.strip())
+    unknown = [c for c in choices if c not in allowed]
+    if unknown or not choices:
+        raise argparse.ArgumentTypeError(f"可选值: {','.join(allowed)}")
+    return choices
+
+
+def add_corpus_arguments(parser):
+    """添加语料参数（供基准测试脚本复用）"""
+    parser.add_argument("--count", type=int, default=200, help="小说数量")
+    parser.add_argument("--size-kb", type=float, default=256, help="每本小说的平均大小（KB）")
+    parser.add_argument("--gbk-ratio", type=float, default=0.5, help="GBK 编码小说的比例")
+    parser.add_argument("--numerals", type=lambda v: parse_choices(v, NUMERAL_FORMS), default=NUMERAL_FORMS,
+                        help="章节编号写法，逗号分隔：arabic,chinese,fullwidth")
+    parser.add_argument("--styles", type=lambda v: parse_choices(v, HEADING_STYLES), default=HEADING_STYLES,
+                        help="章节标题样式，逗号分隔：plain,indent,colon,nospace")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成小说语料")
+    parser.add_argument("folder", help="输出文件夹")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.folder, args.count, args.size_kb, args.gbk_ratio, args.numerals, args.styles, args.seed)
+    total = sum(os.path.getsize(p) for p in paths)
+    print(f"已生成 {len(paths)} 本小说，共 {total / 1024 / 1024:.1f} MB: {os.path.abspath(args.folder)}")
+
+
+if __name__ == "__main__":
+    main()
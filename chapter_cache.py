@@ -0,0 +1,117 @@
+"""
+章节正文缓存：按 (小说内容 MD5, 章节序号) 缓存解码后的章节文本，按内存占用淘汰最久未使用的章节，
+并在后台线程中预读当前章节的前后几章，使连续翻章时无需等待磁盘读取。
+"""
+import sys
+import queue
+import threading
+from collections import OrderedDict
+from file_utils import read_chapter
+
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024  # 默认缓存上限（按字符串对象实际占用的内存计算）
+PREFETCH_RADIUS = 1  # 预读当前章节前后各几章
+
+
+class ChapterTextCache:
+    """线程安全的 LRU 章节正文缓存，界面线程读取、预读线程写入"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, prefetch_radius=PREFETCH_RADIUS):
+        """
+        :param max_bytes: 缓存的内存上限（字节）；单章超过上限时不缓存
+        :param prefetch_radius: 预读当前章节前后各几章，为 0 时不预读
+        """
+        self.max_bytes = max_bytes
+        self.prefetch_radius = prefetch_radius
+        self.size = 0  # 当前缓存占用的字节数
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (md5, 章节序号) -> 章节文本，最近使用的在末尾
+        self._lock = threading.Lock()
+        self._requests = None  # 预读请求队列，第一次预读时才启动线程
+        self._generation = 0  # 每次新的预读请求加一，预读线程据此放弃过时的请求
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """取出缓存的章节文本并标记为最近使用，不存在时返回 None"""
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        """加入缓存，超出上限时淘汰最久未使用的章节"""
+        size = sys.getsizeof(text)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= sys.getsizeof(old)
+            self._entries[key] = text
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= sys.getsizeof(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def read(self, novel_path, md5, chapters, index):
+        """
+        读取一章（优先使用缓存），并在后台预读相邻章节。
+
+        :param md5: 小说内容的 MD5，为空时（内容未知）直接读取，不缓存也不预读
+        :param chapters: 小说的章节列表
+        :param index: 章节序号
+        :return: 章节文本
+        """
+        if not md5:
+            return read_chapter(novel_path, chapters[index])
+        key = (md5, index)
+        text = self.get(key)
+        if text is None:
+            text = read_chapter(novel_path, chapters[index])
+            self.put(key, text)
+        self.prefetch(novel_path, md5, chapters, index)
+        return text
+
+    def prefetch(self, novel_path, md5, chapters, index):
+        """请求后台预读 index 前后的章节（先后一章，再前一章，依次向外），之前尚未完成的预读请求作废"""
+        if not self.prefetch_radius or not md5:
+            return
+        neighbours = []
+        for distance in range(1, self.prefetch_radius + 1):
+            neighbours += [i for i in (index + distance, index - distance) if 0 <= i < len(chapters)]
+        if not neighbours:
+            return
+        if self._requests is None:
+            self._requests = queue.Queue()
+            threading.Thread(target=self._prefetch_worker, daemon=True).start()
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        self._requests.put((generation, novel_path, md5, chapters, neighbours))
+
+    def _prefetch_worker(self):
+        while True:
+            generation, novel_path, md5, chapters, neighbours = self._requests.get()
+            for i in neighbours:
+                with self._lock:
+                    stale = generation != self._generation  # 用户已经切换到别的章节
+                    cached = (md5, i) in self._entries
+                if stale:
+                    break
+                if cached:
+                    continue
+                try:
+                    self.put((md5, i), read_chapter(novel_path, chapters[i]))
+                except OSError:  # 文件被删除或替换，放弃预读
+                    break
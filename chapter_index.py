@@ -0,0 +1,259 @@
+import os
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from file_utils import extract_chapters
+from project_store import write_json_atomic, to_stored_path
+
+INDEX_VERSION = 2  # 章节记录包含 number、name、offset、end
+
+
+class ChapterIndex:
+    """
+    小说章节索引缓存，章节列表以 MD5 为键保存（内容相同的小说共用一份），避免每次点击都重新扫描小说；
+    另按小说路径记录扫描时的文件状态，每本小说只与自己的文件比较是否过期，内容相同的副本不会互相使索引失效。
+    默认保存在 project.json 旁的 chapter_index.json，使用 SQLite 工程存储时保存在 project.db 中。
+    打开工程时不读取索引：JSON 在第一次使用时读取整个文件，SQLite 按 MD5 和路径逐条查询。
+    put、evict 只修改内存中的索引，由 save() 统一写盘（批量建立索引后、关闭工程时），界面操作不会重写整个索引文件。
+    """
+
+    def __init__(self, project_path, store=None):
+        self.project_path = project_path
+        self.index_file = os.path.join(project_path, "chapter_index.json")  # 索引文件路径
+        self.store = store  # SqliteProjectStore，为空时使用 JSON 文件
+        # md5 -> {"mtime_ns", "size", "chapters"}（mtime_ns、size 为最近一次写入时的文件状态）；
+        # JSON 为读取后的全部索引，SQLite 为已查询过的条目
+        self.entries = {}
+        self.files = {}  # 保存的小说路径 -> [md5, mtime_ns, size]，同上
+        self.lock = threading.RLock()  # 后台任务与界面线程可能同时读写索引
+        self._loaded = False  # JSON 索引是否已读取
+        self._changed = set()  # 上次保存后新增或修改的 MD5（SQLite 存储只写入这些行）
+        self._removed = set()
+        self._changed_files = set()  # 上次保存后新增或修改的文件状态
+
+    def load(self):
+        """读取 chapter_index.json（只在第一次使用 JSON 索引时读取），文件损坏时视为空索引"""
+        with self.lock:
+            if self._loaded or self.store:
+                return
+            self.entries, self.files = self._load_json()
+            self._loaded = True
+
+    def _load_json(self):
+        if not os.path.exists(self.index_file):
+            return {}, {}
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"章节索引读取失败，将重新建立: {e}")
+            return {}, {}
+        # 索引格式变化（例如章节记录新增字段）时丢弃旧索引
+        if isinstance(data, dict) and data.get("version") == INDEX_VERSION:
+            return data.get("entries", {}), data.get("files", {})
+        return {}, {}
+
+    def attach_store(self, store):
+        """改为使用 SQLite 存储，并把当前（来自 chapter_index.json 的）全部索引写入其中"""
+        with self.lock:
+            self.load()
+            self.store = store
+            store.save_chapter_index(self.entries, self.files)
+            self._changed.clear()
+            self._removed.clear()
+            self._changed_files.clear()
+
+    def save(self):
+        """保存章节索引，没有变化时不写盘（JSON 先写临时文件再替换；SQLite 只在一个事务中写入变化的条目）"""
+        with self.lock:
+            if not (self._changed or self._removed or self._changed_files):
+                return
+            if self.store:
+                self.store.save_chapter_index(self.entries, self.files, self._changed, self._removed, self._changed_files)
+            else:
+                write_json_atomic(self.index_file, {"version": INDEX_VERSION, "entries": self.entries, "files": self.files})
+            self._changed.clear()
+            self._removed.clear()
+            self._changed_files.clear()
+
+    def _file_key(self, novel_path):
+        return to_stored_path(self.project_path, novel_path)
+
+    def _entry(self, md5):
+        """取出 MD5 的索引条目，不存在时返回 None（SQLite 按需查询并缓存，调用方持有 lock）"""
+        if not self.store:
+            self.load()
+        elif md5 not in self.entries and md5 not in self._removed:
+            entry = self.store.load_chapter_entry(md5)
+            if entry:
+                self.entries[md5] = entry
+        return self.entries.get(md5)
+
+    def _file_state(self, key):
+        """取出小说文件扫描时的状态 [md5, mtime_ns, size]，不存在时返回 None（调用方持有 lock）"""
+        if not self.store:
+            self.load()
+        elif key not in self.files:
+            recorded = self.store.load_chapter_file(key)
+            if recorded and recorded[0] not in self._removed:
+                self.files[key] = recorded
+        return self.files.get(key)
+
+    def is_fresh(self, novel_path, md5):
+        """判断小说的章节索引是否存在且未过期（只与这本小说自己扫描时的文件状态比较）"""
+        if not md5:
+            return False
+        key = self._file_key(novel_path)
+        with self.lock:
+            entry = self._entry(md5)
+            recorded = self._file_state(key)
+        if not entry:
+            return False
+        try:
+            stat = os.stat(novel_path)
+        except OSError:
+            return False
+        if recorded is not None:
+            return tuple(recorded) == (md5, stat.st_mtime_ns, stat.st_size)
+        # 旧版本的索引没有按文件记录状态：与写入条目时的文件状态比较，一致时补记这本小说的状态
+        if entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            return False
+        with self.lock:
+            self.files[key] = [md5, stat.st_mtime_ns, stat.st_size]
+            self._changed_files.add(key)
+        return True
+
+    def cached_chapters(self, novel_path, md5):
+        """返回未过期的章节索引，索引缺失或过期时返回 None（不扫描小说，供批量处理时交给工作进程扫描）"""
+        with self.lock:
+            if self.is_fresh(novel_path, md5):
+                return self.entries[md5]["chapters"]
+        return None
+
+    def get_chapters(self, novel_path, md5, progress=None):
+        """
+        获取小说的章节列表，MD5 或修改时间变化时才重新扫描（扫描结果在下次 save() 时写盘）。
+
+        :param novel_path: 小说文件路径
+        :param md5: 工程中记录的小说 MD5
+        :param progress: 需要重新扫描时在章节之间调用的进度回调，抛出异常可中止扫描
+        :return: 排序后的章节列表
+        """
+        chapters = self.cached_chapters(novel_path, md5)
+        if chapters is not None:
+            return chapters
+        if not os.path.exists(novel_path):
+            return []
+
+        chapters = extract_chapters(novel_path, progress)
+        if md5:
+            self.put(novel_path, md5, chapters)
+        return chapters
+
+    def put(self, novel_path, md5, chapters, save=False):
+        """写入已扫描好的章节索引（例如导入时在工作进程中扫描的结果），save 为 True 时立即写盘"""
+        try:
+            stat = os.stat(novel_path)
+        except OSError:
+            return
+        key = self._file_key(novel_path)
+        with self.lock:
+            self.load()  # JSON 索引保存时整体写出，写入前先读取已有的索引
+            self.entries[md5] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "chapters": chapters}
+            self.files[key] = [md5, stat.st_mtime_ns, stat.st_size]
+            self._changed.add(md5)
+            self._removed.discard(md5)
+            self._changed_files.add(key)
+            if save:
+                self.save()
+
+    def evict(self, md5, save=False):
+        """移除指定 MD5 的章节索引及对应的文件状态，save 为 True 时立即写盘"""
+        with self.lock:
+            self.load()
+            existed = self.entries.pop(md5, None) is not None
+            if not existed and not self.store:  # SQLite 中可能有尚未查询过的条目，总是记为删除
+                return False
+            for key in [key for key, recorded in self.files.items() if recorded[0] == md5]:
+                del self.files[key]
+                self._changed_files.discard(key)
+            self._changed.discard(md5)
+            self._removed.add(md5)
+            if save:
+                self.save()
+            return True
+
+
+def backfill_novels(project_manager, needs, worker, sink=None, jobs=None, progress=None, missing=None, key=None):
+    """
+    为需要补建数据的小说并行执行 worker（章节索引、搜索索引、相似度签名的批量建立共用）。
+    文件已不存在的小说跳过；同一 key（默认 MD5，内容相同的小说）只处理一本。
+    章节索引缺失或过期的小说由工作进程扫描章节，扫描结果写入章节索引，最后只写一次索引。
+
+    :param needs: needs(小说) -> 是否需要处理
+    :param worker: 可在工作进程中执行的模块级函数 worker(小说路径, 章节列表) -> (结果, 章节列表)，
+                   章节列表为 None 时由 worker 调用 extract_chapters 扫描
+    :param sink: 在当前进程中依次写入结果 sink(小说, 结果)，为 None 时只更新章节索引
+    :param jobs: 工作进程数，为 1 时在当前进程处理
+    :param progress: 进度回调 progress(已完成数, 总数)
+    :param missing: 已取得的 find_missing_novels() 结果，未提供时在这里检查
+    :param key: 去重依据 key(小说)，默认为小说的 MD5
+    :return: 处理的小说数量
+    """
+    if missing is None:
+        missing = project_manager.find_missing_novels()  # 一次列出目录，代替逐本检查文件
+    missing = {n.name for n in missing}
+    wanted = {}
+    for novel in project_manager.get_novels():
+        if not novel.md5 or novel.name in missing:
+            continue
+        novel_key = key(novel) if key else novel.md5
+        if novel_key not in wanted and needs(novel):
+            wanted[novel_key] = novel
+    total = len(wanted)
+    if not total:
+        return 0
+
+    index = project_manager.chapter_index
+    novels = list(wanted.values())
+    paths = [novel.path for novel in novels]
+    chapter_lists = [index.cached_chapters(novel.path, novel.md5) for novel in novels]
+    if jobs == 1 or total == 1:
+        results = map(worker, paths, chapter_lists)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(worker, paths, chapter_lists, chunksize=8)
+    try:
+        for done, (novel, cached, (result, chapters)) in enumerate(zip(novels, chapter_lists, results), 1):
+            if cached is None:
+                index.put(novel.path, novel.md5, chapters)
+            if sink:
+                sink(novel, result)
+            if progress:
+                progress(done, total)
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        index.save()
+    return total
+
+
+def _scan_chapters(novel_path, chapters):
+    """在工作进程中执行：扫描章节（backfill_novels 的 worker）"""
+    return None, chapters if chapters is not None else extract_chapters(novel_path)
+
+
+def build_chapter_indexes(project_manager, jobs=None, progress=None, missing=None):
+    """
+    为工程中所有索引缺失或过期的小说并行重建章节索引，最后只写一次索引文件。
+    按文件判断是否过期，内容相同的多本小说各自检查。
+
+    :param jobs, progress, missing: 见 backfill_novels
+    :return: 重建的小说数量
+    """
+    index = project_manager.chapter_index
+    return backfill_novels(
+        project_manager, lambda novel: not index.is_fresh(novel.path, novel.md5), _scan_chapters,
+        jobs=jobs, progress=progress, missing=missing, key=lambda novel: novel.path
+    )
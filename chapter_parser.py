@@ -0,0 +1,61 @@
+import re
+from collections import namedtuple
+
+# 章节标题：可选前导空白 + 第 + 数字（阿拉伯/全角/中文） + 章 + 可选章节名
+CHAPTER_PATTERN = re.compile(
+    r"^[\s\u3000]*第[\s\u3000]*([0-9０-９]+|[零〇一二两三四五六七八九十百千万]+)[\s\u3000]*章[\s\u3000]*(.*?)[\s\u3000]*$"
+)
+
+CHINESE_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+CHINESE_UNITS = {"十": 10, "百": 100, "千": 1000}
+FULLWIDTH_DIGITS = str.maketrans("０１２３４５６７８９", "0123456789")
+
+# 解析结果：章节编号（整数）、章节名（可能为空）、完整标题（去掉首尾空白的原行）
+ChapterHeader = namedtuple("ChapterHeader", ["number", "name", "title"])
+
+
+def chinese_to_int(text):
+    """
+    将中文数字转换为整数，支持“二十三”“一百零五”“两千”“十二万”等写法，
+    以及不带单位的逐位写法（如“一二三”“二〇二四”）。
+    """
+    if all(c in CHINESE_DIGITS for c in text):
+        return int("".join(str(CHINESE_DIGITS[c]) for c in text))
+
+    total = 0  # 已完成的“万”级部分
+    section = 0  # 当前万以内的部分
+    digit = 0  # 尚未遇到单位的数字
+    for c in text:
+        if c in CHINESE_DIGITS:
+            digit = CHINESE_DIGITS[c]
+        elif c in CHINESE_UNITS:
+            section += (digit or 1) * CHINESE_UNITS[c]  # “十三”省略了开头的“一”
+            digit = 0
+        elif c == "万":
+            total = (total + section + digit) * 10000
+            section = digit = 0
+    return total + section + digit
+
+
+def parse_chapter_number(text):
+    """将阿拉伯、全角或中文数字转换为整数"""
+    text = text.translate(FULLWIDTH_DIGITS)
+    if text.isdigit():
+        return int(text)
+    return chinese_to_int(text)
+
+
+def parse_chapter_header(line):
+    """
+    解析一行文本是否为章节标题。先做廉价的前缀检查，只有以“第”开头的行才会进入正则匹配。
+
+    :param line: 一行文本
+    :return: ChapterHeader，不是章节标题时返回 None
+    """
+    stripped = line.lstrip()
+    if not stripped.startswith("第"):
+        return None
+    match = CHAPTER_PATTERN.match(stripped)
+    if not match:
+        return None
+    return ChapterHeader(parse_chapter_number(match.group(1)), match.group(2), line.strip())
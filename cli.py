@@ -0,0 +1,307 @@
+"""
+命令行模式：无需 Tk 即可初始化工程、导入、同步、建索引和合并，适合在无界面的服务器或定时任务中运行。
+
+用法：python -m cli <子命令> <工程文件夹> [参数]
+     python main.py <子命令> <工程文件夹> [参数]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from project_manager import ProjectManager
+
+
+class ProgressReporter:
+    """输出进度：--json 时每行一个 JSON 对象写到标准输出，否则以可读文本写到标准错误"""
+
+    def __init__(self, json_mode):
+        self.json_mode = json_mode
+
+    def emit(self, event, **data):
+        if self.json_mode:
+            print(json.dumps({"event": event, **data}, ensure_ascii=False), flush=True)
+        elif event == "progress":
+            print(f"\r[{data['stage']}] {data['done']}/{data['total']}", end="", file=sys.stderr, flush=True)
+            if data["done"] == data["total"]:
+                print(file=sys.stderr)
+        else:
+            print(f"[{event}] " + ", ".join(f"{k}={v}" for k, v in data.items()), file=sys.stderr)
+
+    def progress_callback(self, stage):
+        """生成供导入、索引等函数使用的进度回调"""
+        return lambda done, total: self.emit("progress", stage=stage, done=done, total=total)
+
+
+def summarize(summary):
+    """把导入/同步汇总中的名单转换为数量"""
+    return {key: len(names) for key, names in summary.items()}
+
+
+_opened_projects = []  # 本次运行打开的工程，子命令结束后关闭
+
+
+def open_project(project_path):
+    """打开已有工程，工程不存在时报错退出"""
+    if not os.path.isdir(project_path):
+        raise SystemExit(f"工程文件夹不存在: {project_path}")
+    project_manager = ProjectManager(project_path)
+    _opened_projects.append(project_manager)
+    return project_manager
+
+
+def run_command(args, reporter):
+    """执行子命令，结束后关闭打开的工程（写入查询时新扫描的章节索引）"""
+    try:
+        return args.func(args, reporter) or 0
+    finally:
+        while _opened_projects:
+            _opened_projects.pop().close()
+
+
+def cmd_init(args, reporter):
+    os.makedirs(os.path.join(args.project, "novels"), exist_ok=True)
+    project_manager = ProjectManager(args.project, backend=args.backend)
+    if not project_manager.store.exists():
+        project_manager.save_project()
+    reporter.emit("result", command="init", project=os.path.abspath(args.project), backend=project_manager.store.backend)
+
+
+def cmd_migrate(args, reporter):
+    project_manager = open_project(args.project)
+    migrated = project_manager.migrate_to_sqlite()
+    reporter.emit("result", command="migrate", migrated=migrated, novels=len(project_manager.novels))
+
+
+def cmd_export(args, reporter):
+    project_manager = open_project(args.project)
+    export_path = project_manager.export_json(args.output)
+    reporter.emit("result", command="export", output=os.path.abspath(export_path), novels=len(project_manager.novels))
+
+
+def cmd_import(args, reporter):
+    from import_pipeline import import_novels
+
+    project_manager = open_project(args.project)
+    summary = import_novels(project_manager, args.files, jobs=args.jobs, progress=reporter.progress_callback("import"))
+    reporter.emit("result", command="import", **summarize(summary))
+    return 1 if summary["failed"] else 0
+
+
+def cmd_sync(args, reporter):
+    from folder_sync import sync_folder, watch_folder
+
+    project_manager = open_project(args.project)
+    if args.watch:
+        on_sync = lambda summary: reporter.emit("result", command="sync", **summarize(summary))
+        try:
+            watch_folder(project_manager, args.folder, interval=args.interval, jobs=args.jobs, on_sync=on_sync)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    summary = sync_folder(
+        project_manager, args.folder, jobs=args.jobs,
+        progress=reporter.progress_callback("sync"), remove_missing=not args.keep_missing
+    )
+    reporter.emit("result", command="sync", **summarize(summary))
+    return 1 if summary["failed"] else 0
+
+
+def cmd_index(args, reporter):
+    from chapter_index import build_chapter_indexes
+    from search_index import build_search_index
+    from similarity import build_signatures
+
+    project_manager = open_project(args.project)
+    missing = project_manager.find_missing_novels()  # 只检查一次文件，后面各步骤共用
+    rebuilt = build_chapter_indexes(
+        project_manager, jobs=args.jobs, progress=reporter.progress_callback("index"), missing=missing
+    )
+    searchable = build_search_index(
+        project_manager, jobs=args.jobs, progress=reporter.progress_callback("search-index"), missing=missing
+    )
+    signed = build_signatures(
+        project_manager, jobs=args.jobs, progress=reporter.progress_callback("signatures"), missing=missing
+    )
+    reporter.emit(
+        "result", command="index", rebuilt=rebuilt, search_indexed=searchable, signatures=signed,
+        novels=len(project_manager.novels), missing=len(missing)
+    )
+
+
+def cmd_search(args, reporter):
+    from search_index import search_project
+
+    project_manager = open_project(args.project)
+    start = time.perf_counter()
+    hits = search_project(project_manager, args.query, limit=args.limit, verify=args.verify)
+    for hit in hits:
+        reporter.emit("hit", **hit)
+    reporter.emit("result", command="search", hits=len(hits), seconds=round(time.perf_counter() - start, 4))
+
+
+def cmd_duplicates(args, reporter):
+    from similarity import find_similar_novels, find_similar_chapters
+
+    project_manager = open_project(args.project)
+    start = time.perf_counter()
+    if args.chapters:
+        pairs = find_similar_chapters(project_manager, threshold=args.threshold)
+        for (novel_a, chapter_a), (novel_b, chapter_b), score in pairs:
+            reporter.emit(
+                "duplicate", novel=novel_a, chapter=chapter_a, duplicate_novel=novel_b,
+                duplicate_chapter=chapter_b, similarity=round(score, 3)
+            )
+    else:
+        pairs = find_similar_novels(project_manager, threshold=args.threshold)
+        for novel, duplicate, score in pairs:
+            reporter.emit("duplicate", novel=novel.name, duplicate=duplicate.name, similarity=round(score, 3))
+    reporter.emit("result", command="duplicates", pairs=len(pairs), seconds=round(time.perf_counter() - start, 4))
+
+
+def cmd_merge(args, reporter):
+    from merge_engine import merge_novel_files
+
+    project_manager = open_project(args.project)
+    novels = project_manager.get_merge_order()
+    if args.duplicates != "keep":
+        from similarity import filter_duplicate_novels
+
+        kept, skipped = filter_duplicate_novels(project_manager, novels, threshold=args.threshold)
+        for novel, original, score in skipped:
+            reporter.emit(
+                "duplicate", novel=novel.name, duplicate_of=original.name, similarity=round(score, 3),
+                skipped=args.duplicates == "skip"
+            )
+        if args.duplicates == "skip":
+            novels = kept
+    if not novels:
+        raise SystemExit("当前工程没有可合并的小说")
+
+    save_path = args.output or project_manager.get_merge_output_path()
+    os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
+    progress = reporter.progress_callback("merge")
+    start = time.perf_counter()
+    if args.compress or args.volume_mb or args.volume_chapters:
+        from merge_output import merge_novel_volumes
+
+        max_bytes = int(args.volume_mb * 1024 * 1024) if args.volume_mb else None
+        try:
+            volumes = merge_novel_volumes(
+                novels, save_path, compression=args.compress, max_bytes=max_bytes,
+                max_chapters=args.volume_chapters, progress=progress, jobs=args.jobs
+            )
+        except ValueError as e:
+            raise SystemExit(str(e))
+        reporter.emit(
+            "result", command="merge", output=[os.path.abspath(v["path"]) for v in volumes], novels=len(novels),
+            chapters=sum(v["chapter_count"] for v in volumes), seconds=round(time.perf_counter() - start, 3)
+        )
+        return
+
+    chapters = merge_novel_files(novels, save_path, incremental=not args.full, progress=progress, jobs=args.jobs)
+    reporter.emit(
+        "result", command="merge", output=os.path.abspath(save_path), novels=len(novels),
+        chapters=chapters, seconds=round(time.perf_counter() - start, 3)
+    )
+
+
+def cmd_chapter(args, reporter):
+    from merged_toc import MergedChapterReader
+
+    project_manager = open_project(args.project)
+    save_path = args.output or project_manager.get_merge_output_path()
+    try:
+        with MergedChapterReader(save_path) as reader:
+            text = reader.read_chapter(args.number)
+    except OSError:
+        raise SystemExit(f"合并文件或章节索引不存在，请先执行 merge: {save_path}")
+    except (ValueError, IndexError) as e:
+        raise SystemExit(str(e))
+    sys.stdout.write(text)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description="短篇小说合并工具（命令行模式）")
+    parser.add_argument("--json", action="store_true", help="以 JSON Lines 格式在标准输出报告进度和结果")
+    parser.add_argument("--stats", metavar="FILE", help="统计各阶段耗时和读写量，结束后写入 JSON 报告")
+    parser.add_argument("--profile", metavar="FILE", help="用 cProfile 剖析本次运行并保存到文件")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, func, help_text, jobs=False):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument("project", help="工程文件夹")
+        if jobs:
+            sub.add_argument("-j", "--jobs", type=int, default=None, help="并行工作进程数（默认使用全部 CPU 核）")
+        sub.set_defaults(func=func)
+        return sub
+
+    sub = add_command("init", cmd_init, "创建工程")
+    sub.add_argument("--backend", choices=["json", "sqlite"], default=None, help="工程存储类型（默认 project.json）")
+
+    sub = add_command("import", cmd_import, "导入小说文件", jobs=True)
+    sub.add_argument("files", nargs="+", help="要导入的 TXT 文件")
+
+    sub = add_command("sync", cmd_sync, "与外部文件夹同步", jobs=True)
+    sub.add_argument("folder", help="外部小说文件夹")
+    sub.add_argument("--keep-missing", action="store_true", help="源文件已删除时不从工程中移除")
+    sub.add_argument("--watch", action="store_true", help="持续监视文件夹并自动同步")
+    sub.add_argument("--interval", type=float, default=2.0, help="监视模式下的检查间隔（秒）")
+
+    add_command("index", cmd_index, "重建缺失或过期的章节索引，并为未建立搜索索引的小说建立索引", jobs=True)
+
+    sub = add_command("search", cmd_search, "在工程的所有小说中全文搜索（未建立索引的小说请先执行 index）")
+    sub.add_argument("query", help="查询词，空白分隔的多个片段需出现在同一章中")
+    sub.add_argument("--limit", type=int, default=100, help="最多返回的结果数")
+    sub.add_argument("--verify", action="store_true", help="读取候选章节核对查询词并生成摘要（默认只查询索引）")
+
+    sub = add_command("duplicates", cmd_duplicates, "列出近似重复的小说或章节（在此功能之前导入的小说请先执行 index）")
+    sub.add_argument("--chapters", action="store_true", help="比较章节而不是整本小说")
+    sub.add_argument("--threshold", type=float, default=0.8, help="判定为重复的相似度（0～1，默认 0.8）")
+
+    add_command("migrate", cmd_migrate, "将 project.json 工程迁移到 SQLite 存储（project.db）")
+
+    sub = add_command("export", cmd_export, "以 project.json 格式导出工程")
+    sub.add_argument("-o", "--output", help="导出文件路径（默认为工程中的 project.json）")
+
+    sub = add_command("merge", cmd_merge, "合并工程中的小说", jobs=True)
+    sub.add_argument("-o", "--output", help="合并结果路径（默认为工程根目录下的 <工程名>.txt）")
+    sub.add_argument("--full", action="store_true", help="忽略上次的片段清单，完整重新合并")
+    sub.add_argument("--compress", choices=["gzip", "bz2", "xz", "zstd"], help="合并时直接压缩输出")
+    sub.add_argument("--volume-mb", type=float, help="按大小分卷：每卷最多多少 MB（未压缩）")
+    sub.add_argument("--volume-chapters", type=int, help="按章节数分卷：每卷最多多少章")
+    sub.add_argument("--duplicates", choices=["keep", "flag", "skip"], default="keep",
+                     help="近似重复的小说：keep 不检查，flag 报告后照常合并，skip 只保留合并顺序最靠前的一本")
+    sub.add_argument("--threshold", type=float, default=0.8, help="判定为重复的相似度（0～1，默认 0.8）")
+
+    sub = add_command("chapter", cmd_chapter, "按全局编号输出合并结果中的一章")
+    sub.add_argument("number", type=int, help="章节编号（从 1 开始）")
+    sub.add_argument("-o", "--output", help="合并结果路径（默认为工程根目录下的 <工程名>.txt）")
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    reporter = ProgressReporter(args.json)
+    if not (args.stats or args.profile):
+        return run_command(args, reporter)
+
+    import instrumentation
+
+    instrumentation.enable(profile=bool(args.profile))
+    try:
+        return run_command(args, reporter)
+    finally:
+        instrumentation.disable()
+        if args.stats:
+            instrumentation.write_report(args.stats)
+            reporter.emit("stats", output=os.path.abspath(args.stats))
+        if args.profile:
+            instrumentation.dump_profile(args.profile)
+            reporter.emit("profile", output=os.path.abspath(args.profile))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
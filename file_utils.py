@@ -1,8 +1,16 @@
 import os
+import io
+import codecs
 import hashlib
-import re
+import mmap
 import shutil
-import chardet
+from chardet.universaldetector import UniversalDetector
+from chapter_parser import parse_chapter_header
+
+try:
+    import xxhash  # 可选依赖，更快的非加密哈希
+except ImportError:
+    xxhash = None
 
 
 def compute_md5(file_path):
@@ -20,46 +28,217 @@ def list_text_files(directory):
     """列出目录下的所有 .txt 文件"""
     return [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".txt")]
 
-def detect_updates(existing_novel, new_path):
-    """检查外部小说文件是否比项目内的小说更新"""
-    new_md5 = compute_md5(new_path)  # 计算外部新文件的MD5
-    old_md5 = compute_md5(existing_novel["path"])  # 计算项目文件夹内小说的MD5
+def new_fast_hasher():
+    """返回快速哈希对象：优先使用 xxhash，未安装时使用 BLAKE2"""
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
 
-    return new_md5 != old_md5, new_md5  # 如果不同，说明有更新
 
+FAST_HASH_NAME = "xxh3_128" if xxhash is not None else "blake2b-128"
+PARTIAL_HASH_BLOCK = 64 * 1024  # 局部哈希读取的头部/尾部字节数
 
-def extract_chapters(file_path):
-    """从小说文件中提取章节标题并排序"""
-    
-    chapter_pattern = re.compile(r"(^[\s\u3000]*第[\s\u3000]*(?:\d+|一|二|三|四|五|六|七|八|九|十)[\s\u3000]*章[\s\u3000]*(.*)?$|^第(\d+|[一二三四五六七八九十]+)章)")
-    
-    chapters = []
 
+def compute_fast_hash(file_path):
+    """计算整个文件的快速哈希值"""
+    hasher = new_fast_hasher()
+    try:
+        with open(file_path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                hasher.update(chunk)
+    except FileNotFoundError:
+        return None
+    return hasher.hexdigest()
+
+
+def compute_partial_hash(file_path, size):
+    """只读取文件头部和尾部计算局部哈希（同时混入文件大小）"""
+    hasher = new_fast_hasher()
+    hasher.update(str(size).encode("ascii"))
+    with open(file_path, "rb") as f:
+        hasher.update(f.read(PARTIAL_HASH_BLOCK))
+        if size > PARTIAL_HASH_BLOCK:
+            f.seek(max(PARTIAL_HASH_BLOCK, size - PARTIAL_HASH_BLOCK))
+            hasher.update(f.read(PARTIAL_HASH_BLOCK))
+    return hasher.hexdigest()
+
+
+def file_fingerprint(file_path, full_hash=None, stat=None):
+    """
+    计算文件指纹：大小、修改时间、局部哈希，以及（可选的）完整快速哈希。
+
+    :param file_path: 文件路径
+    :param full_hash: 已计算好的完整快速哈希（例如导入时顺带计算的），没有时不计算
+    :param stat: 计算 full_hash 之前取得的 os.stat 结果，使大小、修改时间与哈希对应同一份内容
+    :return: 指纹字典，文件不存在时返回 None
+    """
+    if stat is None:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+    return {
+        "path": os.path.abspath(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "partial": compute_partial_hash(file_path, stat.st_size),
+        "hash": full_hash,
+        "hash_name": FAST_HASH_NAME,
+    }
+
+
+def source_changed(source, file_path):
+    """
+    按代价从低到高判断外部文件是否相对记录的指纹发生了变化：
+    大小和修改时间都相同直接视为未变化；局部哈希不同视为已变化；否则再比较完整快速哈希。
+
+    :param source: 工程中记录的源文件指纹，可为空
+    :param file_path: 外部文件路径
+    :return: (是否变化, 最新指纹)；未变化时返回的指纹可用于刷新修改时间和路径
+             （源文件夹被移动后内容未变的文件，返回的指纹带有新路径，与记录的指纹不同）
+    """
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.readlines()
-            for i, line in enumerate(content):
-                match = chapter_pattern.search(line)
-                if match:
-                    chapters.append({"title": line.strip(), "start_line": i})
+        stat = os.stat(file_path)
+    except OSError:
+        return True, None
+    if not source or "size" not in source:
+        return True, None
+    if stat.st_size == source["size"] and stat.st_mtime_ns == source["mtime_ns"]:
+        path = os.path.abspath(file_path)
+        return False, source if source.get("path") == path else dict(source, path=path)
 
-        # 章节排序
-        chapters.sort(key=lambda ch: int(re.findall(r"\d+", ch["title"])[0]) if re.findall(r"\d+", ch["title"]) else 0)
+    fingerprint = file_fingerprint(file_path)
+    if fingerprint is None or fingerprint["partial"] != source["partial"]:
+        return True, fingerprint
+    if not source.get("hash") or source.get("hash_name") != FAST_HASH_NAME:
+        return True, fingerprint
 
+    fingerprint["hash"] = compute_fast_hash(file_path)
+    return fingerprint["hash"] != source["hash"], fingerprint
+
+
+def detect_updates(existing_novel, new_path):
+    """
+    检查外部小说文件是否比项目内的小说更新（先比较廉价指纹，必要时才计算完整哈希）。
+    与旧版本不同，不再计算两边的 MD5，第二个返回值是外部文件的指纹而不是 MD5。
+
+    :param existing_novel: 工程中的小说记录（使用其 source 中记录的源文件指纹）
+    :param new_path: 外部小说文件路径
+    :return: (是否更新, 外部文件的最新指纹字典)；外部文件不存在或没有记录指纹时指纹可能为 None
+    """
+    updated, fingerprint = source_changed(existing_novel.source, new_path)
+    return updated, fingerprint  # 如果不同，说明有更新
+
+
+class ChapterScanner:
+    """增量章节扫描器：逐行或按块输入字节，记录章节标题的行号与字节偏移（按文件顺序）"""
+
+    def __init__(self, encoding="utf-8"):
+        self.encoding = encoding
+        self.chapters = []
+        self.offset = 0  # 已处理的字节数
+        self.line_number = 0
+        self._pending = b""  # 按块输入时尚未结束的行
+
+    def feed_line(self, raw_line):
+        """输入完整的一行（包含换行符）"""
+        header = parse_chapter_header(raw_line.decode(self.encoding))
+        if header:
+            if self.chapters:
+                self.chapters[-1]["end"] = self.offset  # 上一章到本章标题前结束
+            self.chapters.append({
+                "title": header.title,
+                "number": header.number,
+                "name": header.name,
+                "start_line": self.line_number,
+                "offset": self.offset,
+                "end": None,
+            })
+        self.offset += len(raw_line)
+        self.line_number += 1
+
+    def feed(self, data):
+        """输入任意切分的字节块"""
+        lines = (self._pending + data).split(b"\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self.feed_line(line + b"\n")
+
+    def close(self):
+        """结束输入，返回章节列表"""
+        if self._pending:
+            self.feed_line(self._pending)
+            self._pending = b""
+        if self.chapters:
+            self.chapters[-1]["end"] = self.offset
+        return self.chapters
+
+
+def _scan_chapters_with_encoding(file_path, encoding, progress=None):
+    """按指定编码逐行扫描章节，每发现一章调用一次 progress(已扫描字节数, 文件大小)"""
+    scanner = ChapterScanner(encoding)
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        for raw_line in f:
+            found = len(scanner.chapters)
+            scanner.feed_line(raw_line)
+            if progress and len(scanner.chapters) != found:
+                progress(scanner.offset, size)
+    return scanner.close()
+
+
+def scan_chapters(file_path, progress=None):
+    """
+    扫描小说文件中的章节标题（不排序）。
+
+    :param file_path: 小说文件路径
+    :param progress: 进度回调，在章节之间调用，抛出异常可中止扫描（例如后台任务被取消）
+    :return: 章节列表，每项包含 title、start_line、offset（标题行起始字节）和 end（章节结束字节）
+    """
+    try:
+        return _scan_chapters_with_encoding(file_path, "utf-8", progress)
     except UnicodeDecodeError:
-        with open(file_path, "r", encoding="gbk") as f:
-            content = f.readlines()
-            for i, line in enumerate(content):
-                match = chapter_pattern.search(line)
-                if match:
-                    chapters.append({"title": line.strip(), "start_line": i})
-
-        # 章节排序
-        chapters.sort(key=lambda ch: int(re.findall(r"\d+", ch["title"])[0]) if re.findall(r"\d+", ch["title"]) else 0)
+        return _scan_chapters_with_encoding(file_path, "gbk", progress)
+
+
+def sort_chapters(chapters):
+    """按扫描时解析出的章节编号排序（编号相同时保持文件顺序）"""
+    chapters.sort(key=lambda ch: ch["number"])
+    return chapters
+
+
+def extract_chapters(file_path, progress=None):
+    """从小说文件中提取章节标题并排序（progress 见 scan_chapters）"""
+    chapters = scan_chapters(file_path, progress)
+
+    # 章节排序
+    sort_chapters(chapters)
    # print(chapters)
     return chapters
     
     
+def read_chapter(file_path, chapter):
+    """
+    按字节偏移随机读取单个章节的内容，不读取整个文件。
+
+    :param file_path: 小说文件路径
+    :param chapter: scan_chapters / extract_chapters 返回的章节信息（需包含 offset 和 end）
+    :return: 章节文本（包含标题行）
+    """
+    start, end = chapter["offset"], chapter["end"]
+    if end <= start:
+        return ""
+
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = mm[start:end]
+
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("gbk", errors="ignore")
+
+
 def copy_file_to_path(source_file, target_folder):
     try:
         # 检查源文件是否存在
@@ -85,6 +264,66 @@ def copy_file_to_path(source_file, target_folder):
         print(f"复制文件时出现错误: {e}")
         return None
 
+ENCODING_SAMPLE_SIZE = 256 * 1024  # 编码检测最多读取的字节数
+TRANSCODE_CHUNK_SIZE = 1024 * 1024  # 流式转码每次读取的字符数
+
+# chardet 常把 GBK 文本识别为 GB2312，统一按超集 GB18030 解码以免丢字
+ENCODING_ALIASES = {"gb2312": "gb18030", "gbk": "gb18030", "ascii": "utf-8"}
+
+
+def _is_utf8_sample(sample, complete):
+    """严格检查样本是否为合法 UTF-8（样本被截断时允许末尾残缺的多字节字符）"""
+    decoder = codecs.getincrementaldecoder("utf-8")("strict")
+    try:
+        decoder.decode(sample, final=complete)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def detect_encoding(file_path, sample_size=ENCODING_SAMPLE_SIZE, try_utf8=True):
+    """
+    检测文件编码：先走严格 UTF-8 快速路径，再用 chardet 增量检测有限大小的样本，置信度足够时提前停止。
+
+    :param file_path: 文件路径
+    :param sample_size: 最多读取的字节数，None 表示读取整个文件
+    :param try_utf8: 是否尝试 UTF-8 快速路径
+    :return: 编码名称，无法检测时返回 None
+    """
+    with open(file_path, "rb") as f:
+        sample = f.read(sample_size) if sample_size else f.read()
+        complete = not sample_size or len(sample) < sample_size or not f.read(1)
+
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if try_utf8 and _is_utf8_sample(sample, complete):
+        return "utf-8"
+
+    return _detect_sample_encoding(sample)
+
+
+def _detect_sample_encoding(sample):
+    """用 chardet 增量检测样本编码，置信度足够高时提前停止"""
+    detector = UniversalDetector()
+    for start in range(0, len(sample), 16 * 1024):
+        detector.feed(sample[start:start + 16 * 1024])
+        if detector.done:  # 置信度已足够高
+            break
+    detector.close()
+
+    encoding = detector.result["encoding"]
+    if not encoding:
+        return None
+    return ENCODING_ALIASES.get(encoding.lower(), encoding)
+
+
+def _transcode_file(file_path, temp_path, encoding, errors):
+    """按块流式转码为 UTF-8（文本模式读写，与原实现一样统一换行符）"""
+    with open(file_path, "r", encoding=encoding, errors=errors) as src, \
+            open(temp_path, "w", encoding="utf-8") as dst:
+        shutil.copyfileobj(src, dst, TRANSCODE_CHUNK_SIZE)
+
+
 def convert_to_utf8(file_path, output_path=None):
     """
     将非UTF-8编码的TXT文件转换为UTF-8编码。
@@ -93,28 +332,112 @@ def convert_to_utf8(file_path, output_path=None):
     :param output_path: 转换后保存的路径，默认为原文件路径（覆盖原文件）
     :return: 转换后的文件路径
     """
-    # 读取文件并检测编码
-    with open(file_path, "rb") as f:
-        raw_data = f.read()
-        detected_encoding = chardet.detect(raw_data)['encoding']
+    # 只读取样本检测编码
+    detected_encoding = detect_encoding(file_path)
     
     if not detected_encoding:
         raise ValueError(f"无法检测 {file_path} 的编码格式")
     
-    # 读取文件内容并重新编码为UTF-8
-    with open(file_path, "r", encoding=detected_encoding, errors="ignore") as f:
-        content = f.read()
-    
     # 如果没有指定输出路径，则覆盖原文件
     if output_path is None:
         output_path = file_path
 
-    # 以UTF-8保存文件
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(content)
+    # 先写入临时文件再替换，转码失败时不会破坏原文件
+    temp_path = output_path + ".tmp"
+    try:
+        if detected_encoding == "utf-8":
+            try:
+                _transcode_file(file_path, temp_path, "utf-8", "strict")
+            except UnicodeDecodeError:
+                # 样本之后出现非 UTF-8 内容，退回到对整个文件做检测
+                detected_encoding = detect_encoding(file_path, sample_size=None, try_utf8=False) or "gb18030"
+                _transcode_file(file_path, temp_path, detected_encoding, "ignore")
+        else:
+            _transcode_file(file_path, temp_path, detected_encoding, "ignore")
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
     
     #print(f"文件 {file_path} 已转换为 UTF-8 并保存至 {output_path}")
+    return output_path
     
+def _ingest_with_encoding(source, first_chunk, encoding, errors, output_file):
+    """按给定编码完成一次读取：转码写出，同时计算原始字节的快速哈希、转码后 MD5 并扫描章节"""
+    raw_hasher = new_fast_hasher()
+    hasher = hashlib.md5()
+    scanner = ChapterScanner()
+    # 与文本模式读写一致：统一换行符为当前系统的换行符
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(errors), translate=True)
+
+    def write(text):
+        if os.linesep != "\n":
+            text = text.replace("\n", os.linesep)
+        data = text.encode("utf-8")
+        hasher.update(data)
+        scanner.feed(data)
+        output_file.write(data)
+
+    chunk = first_chunk
+    position = 0  # 当前数据块在源文件中的偏移
+    while chunk:
+        raw_hasher.update(chunk)
+        try:
+            write(decoder.decode(chunk))
+        except UnicodeDecodeError as e:
+            e.position = position + max(e.start, 0)  # 出错的大致位置，供调用方在附近取样重新检测编码
+            raise
+        position += len(chunk)
+        chunk = source.read(TRANSCODE_CHUNK_SIZE)
+    write(decoder.decode(b"", final=True))
+
+    return {"md5": hasher.hexdigest(), "source_hash": raw_hasher.hexdigest(), "chapters": scanner.close()}
+
+
+def ingest_file(source_path, output_path):
+    """
+    单次读取完成导入：转码为 UTF-8 写入 output_path，同时计算原始文件的快速哈希、转码后文件的 MD5，并扫描章节偏移。
+
+    :param source_path: 外部小说文件路径
+    :param output_path: 转码结果路径（通常是工程小说目录中的临时文件）
+    :return: {"encoding", "md5", "source_hash", "chapters"}，chapters 已排序
+    """
+    with open(source_path, "rb") as source, open(output_path, "wb") as output_file:
+        first_chunk = source.read(max(ENCODING_SAMPLE_SIZE, TRANSCODE_CHUNK_SIZE))
+        sample = first_chunk[:ENCODING_SAMPLE_SIZE]
+        complete = len(first_chunk) <= ENCODING_SAMPLE_SIZE  # 样本即整个文件
+
+        if sample.startswith(codecs.BOM_UTF8):
+            encoding = "utf-8-sig"
+        elif _is_utf8_sample(sample, complete):
+            encoding = "utf-8"
+        else:
+            encoding = None
+
+        result = None
+        if encoding:
+            try:
+                result = _ingest_with_encoding(source, first_chunk, encoding, "strict", output_file)
+            except UnicodeDecodeError as e:
+                # 样本之后出现非 UTF-8 内容：在出错位置取有限大小的样本重新检测，再读一遍（少见情况）
+                source.seek(e.position)
+                encoding = _detect_sample_encoding(source.read(ENCODING_SAMPLE_SIZE)) or "gb18030"
+                source.seek(0)
+                output_file.seek(0)
+                output_file.truncate()
+                first_chunk = source.read(max(ENCODING_SAMPLE_SIZE, TRANSCODE_CHUNK_SIZE))
+        else:
+            encoding = _detect_sample_encoding(sample)
+
+        if result is None:
+            if not encoding:
+                raise ValueError(f"无法检测 {source_path} 的编码格式")
+            result = _ingest_with_encoding(source, first_chunk, encoding, "ignore", output_file)
+
+    result["encoding"] = encoding
+    sort_chapters(result["chapters"])
+    return result
+
 #替换文件名空格
 def replace_spaces_in_filename(filename):
     """将文件名中的空格替换为 '-'"""
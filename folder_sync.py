@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import select
+import ctypes
+import ctypes.util
+from file_utils import list_text_files
+from import_pipeline import import_novels
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+
+def sync_folder(project_manager, source_folder, jobs=None, progress=None, remove_missing=True):
+    """
+    将外部文件夹与工程同步：只导入新增或变化的小说，移除源文件已删除的小说。
+    变化检测基于 project.json 中记录的源文件指纹，章节索引只为受影响的小说重建。
+
+    :param project_manager: 工程管理器
+    :param source_folder: 外部小说文件夹
+    :param jobs: 并行导入的工作进程数
+    :param progress: 进度回调 progress(已完成数, 总数)
+    :param remove_missing: 是否移除源文件已不存在的小说
+    :return: 同步汇总 {"added", "updated", "unchanged", "failed", "removed"}
+    """
+    source_paths = sorted(list_text_files(source_folder))
+    summary = import_novels(project_manager, source_paths, jobs=jobs, progress=progress)
+    summary["removed"] = []
+
+    if remove_missing:
+        folder = os.path.normcase(os.path.abspath(source_folder))
+        present = {os.path.normcase(os.path.abspath(p)) for p in source_paths}
+        for novel in project_manager.get_novels():
+            source = novel.source
+            if not source:
+                continue
+            source_path = os.path.normcase(os.path.abspath(source["path"]))
+            # 只处理来自该文件夹、且源文件已不存在的小说
+            if os.path.dirname(source_path) == folder and source_path not in present:
+                project_manager.remove_novel(novel.name, save=False)
+                summary["removed"].append(novel.name)
+        if summary["removed"]:
+            project_manager.save_project()
+            project_manager.chapter_index.save()
+
+    return summary
+
+
+class PollingWatcher:
+    """轮询方式监视文件夹：比较 .txt 文件的大小和修改时间"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.snapshot = self._take_snapshot()
+
+    def _take_snapshot(self):
+        snapshot = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(".txt") and entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout):
+        """等待 timeout 秒，返回期间文件夹是否有变化"""
+        time.sleep(timeout)
+        snapshot = self._take_snapshot()
+        changed = snapshot != self.snapshot
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux 下使用 inotify 监视文件夹（通过 ctypes 调用 libc，无需额外依赖）"""
+
+    def __init__(self, folder):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if self.libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"无法监视文件夹 {folder}")
+
+    def wait(self, timeout):
+        """等待最多 timeout 秒，返回期间是否收到文件事件"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):  # 读空事件队列，具体事件交给同步时的指纹比较
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(folder):
+    """优先使用 inotify，不可用时（非 Linux 或超出监视数量限制）退回轮询"""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folder)
+        except (OSError, AttributeError) as e:
+            print(f"inotify 不可用，改用轮询: {e}")
+    return PollingWatcher(folder)
+
+
+def watch_folder(project_manager, source_folder, interval=2.0, settle=1.0, jobs=None, on_sync=None, stop_event=None):
+    """
+    持续监视外部文件夹，文件变化平静 settle 秒后执行一次增量同步。
+
+    :param interval: 每次等待事件的最长时间（轮询模式下即轮询间隔）
+    :param settle: 去抖时间，避免文件还在写入时就开始同步
+    :param on_sync: 每次同步后的回调 on_sync(汇总)
+    :param stop_event: threading.Event，设置后停止监视
+    """
+    summary = sync_folder(project_manager, source_folder, jobs=jobs)  # 启动时先同步一次
+    if on_sync:
+        on_sync(summary)
+
+    watcher = create_watcher(source_folder)
+    try:
+        while not (stop_event and stop_event.is_set()):
+            if not watcher.wait(interval):
+                continue
+            while watcher.wait(settle):  # 等待文件写入完成
+                pass
+            summary = sync_folder(project_manager, source_folder, jobs=jobs)
+            if on_sync:
+                on_sync(summary)
+    finally:
+        watcher.close()
@@ -3,8 +3,15 @@ from tkinter import ttk, filedialog, messagebox
 from tkinterdnd2 import TkinterDnD, DND_FILES
 
 import os
-import re
 from project_manager import ProjectManager
+from merge_engine import merge_novel_files
+from import_pipeline import import_novels
+from folder_sync import sync_folder
+from search_index import build_search_index, search_project
+from similarity import filter_duplicate_novels
+from task_runner import TaskRunner
+from chapter_cache import ChapterTextCache
+from lazy_views import BatchedTreeLoader, ProgressiveTextLoader, sync_tree_items
 from file_utils import compute_md5, list_text_files, detect_updates, extract_chapters, replace_spaces_in_filename, copy_file_to_path, replace_space, convert_to_utf8
 
 
@@ -15,6 +22,7 @@ class NovelManagerGUI:
         self.root.geometry("1500x600")
 
         self.project_manager = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # 顶部按钮栏
         self.button_frame = ttk.Frame(self.root)
@@ -28,6 +36,10 @@ class NovelManagerGUI:
 
         self.btn_import_novel = ttk.Button(self.button_frame, text="导入小说", command=self.import_novel)
         self.btn_import_novel.pack(side="left", padx=2)
+
+        # 同步文件夹按钮
+        self.btn_sync_folder = ttk.Button(self.button_frame, text="同步文件夹", command=self.sync_novel_folder)
+        self.btn_sync_folder.pack(side="left", padx=2)
         
         # 导出按钮
         self.btn_merge_novel = ttk.Button(self.button_frame, text="合并小说", command=self.merge_novels)
@@ -36,6 +48,33 @@ class NovelManagerGUI:
         # 删除按钮
         self.btn_remove_novel = ttk.Button(self.button_frame, text="删除小说", command=self.delete_selected_novel)
         self.btn_remove_novel.pack(side="left", padx=2)
+
+        # 全文搜索
+        self.search_var = tk.StringVar()
+        self.search_entry = ttk.Entry(self.button_frame, textvariable=self.search_var, width=24)
+        self.search_entry.pack(side="left", padx=(12, 2))
+        self.search_entry.bind("<Return>", lambda event: self.search_novels())
+        self.btn_search = ttk.Button(self.button_frame, text="搜索", command=self.search_novels)
+        self.btn_search.pack(side="left", padx=2)
+
+        # 取消按钮和进度显示
+        self.btn_cancel_task = ttk.Button(self.button_frame, text="取消", command=self.cancel_task, state="disabled")
+        self.btn_cancel_task.pack(side="right", padx=2)
+        self.status_var = tk.StringVar()
+        self.status_label = ttk.Label(self.button_frame, textvariable=self.status_var)
+        self.status_label.pack(side="right", padx=2)
+
+        # 后台任务：耗时操作在工作线程中执行，运行期间禁用会修改工程的按钮
+        self.task_runner = TaskRunner(self.root)
+        self.current_task = None
+        self.chapter_task = None
+        self.content_task = None
+        # 章节正文缓存：按内容 MD5 和章节序号缓存，后台预读相邻章节，前后翻章时不再读取磁盘
+        self.chapter_cache = ChapterTextCache()
+        self.action_buttons = [
+            self.btn_new_project, self.btn_open_project, self.btn_import_novel,
+            self.btn_sync_folder, self.btn_merge_novel, self.btn_remove_novel, self.btn_search,
+        ]
        
         # 配置列权重，让左侧和中间宽度为右侧的三分之一
         self.root.columnconfigure(0, weight=3)
@@ -87,6 +126,10 @@ class NovelManagerGUI:
         self.text_area.configure(yscrollcommand=self.text_vscroll.set)
         self.text_vscroll.pack(side="right", fill="y")
         self.text_area.pack(side="left", fill="both", expand=True)
+
+        # 大列表分批插入、长章节分段显示
+        self.chapter_loader = BatchedTreeLoader(self.root, self.chapter_tree)
+        self.text_loader = ProgressiveTextLoader(self.root, self.text_area)
     
     def on_file_drop(self, event):
         file_path = event.data.strip()  # 去掉路径两端的空白字符
@@ -102,9 +145,24 @@ class NovelManagerGUI:
         else:
             print (f"请拖放一个有效的txt文件！")  # 如果不是txt文件，弹出警告
     
+    def close_project(self):
+        """关闭当前工程的数据库连接并写入尚未保存的章节索引（打开或新建另一个工程、退出之前调用）"""
+        for task in (self.chapter_task, self.content_task):
+            if task:
+                task.cancel()
+        if self.project_manager:
+            self.project_manager.close()
+            self.project_manager = None
+
+    def on_close(self):
+        """退出前关闭工程（写入尚未保存的章节索引）"""
+        self.close_project()
+        self.root.destroy()
+
     def create_project(self):
         project_path = filedialog.askdirectory(title="选择工程文件夹")
         if project_path:
+            self.close_project()
             self.project_manager = ProjectManager(project_path)
             #创建放置小说的文件夹
             novels_folder = os.path.join(project_path, 'novels')
@@ -119,88 +177,123 @@ class NovelManagerGUI:
     def open_project(self):
         project_path = filedialog.askdirectory(title="选择工程文件夹")
         if project_path:
+            self.close_project()
             self.project_manager = ProjectManager(project_path)
             messagebox.showinfo("成功", "工程加载成功！")
             self.refresh_novel_list()
 
     def import_novel(self,new_path=None):
-        """导入小说文件"""
+        """导入小说文件（支持多选，多个文件时并行处理）"""
         if not self.project_manager:
             messagebox.showerror("错误", "请先创建或打开工程")
             return
-        if not new_path:
-            new_path = filedialog.askopenfilename(filetypes=[("文本文件", "*.txt")])
         # 选择小说文件
-        
-        project_path = os.path.join(self.project_manager.project_path, "cache")
-        file_path = copy_file_to_path(new_path, project_path)  # 复制新文件
-        convert_to_utf8(file_path)
-        new_path=file_path
-        if not new_path:
+        if new_path:
+            source_paths = [new_path]
+        else:
+            source_paths = list(filedialog.askopenfilenames(filetypes=[("文本文件", "*.txt")]))
+        if not source_paths:
             return
 
-        # 获取原始文件名，并转换为标准格式（空格替换为 '-'）
-        new_filename = replace_spaces_in_filename(os.path.basename(new_path))
+        def on_done(summary):
+            if summary["added"] or summary["updated"]:
+                self.refresh_novel_list()
 
-        # 查找同名小说（基于文件名匹配，空格替换后）
-        existing_novel = next(
-            (n for n in self.project_manager.get_novels() if replace_spaces_in_filename(os.path.basename(n["path"])) == new_filename), 
-            None
-        )
+            if len(source_paths) == 1:
+                if summary["updated"]:
+                    messagebox.showinfo("检测到更新", f"《{summary['updated'][0]}》有更新，已更新")
+                elif summary["unchanged"]:
+                    messagebox.showinfo("提示", f"《{summary['unchanged'][0]}》无变化")
+                elif summary["failed"]:
+                    messagebox.showerror("错误", f"《{summary['failed'][0]}》导入失败")
+            else:
+                messagebox.showinfo(
+                    "导入完成",
+                    f"新增 {len(summary['added'])} 本，更新 {len(summary['updated'])} 本，"
+                    f"无变化 {len(summary['unchanged'])} 本，失败 {len(summary['failed'])} 本"
+                )
+
+        self.run_task("导入", import_novels, self.project_manager, source_paths, on_done=on_done)
+
+    def sync_novel_folder(self):
+        """选择外部文件夹，只导入新增或变化的小说，并移除源文件已删除的小说"""
+        if not self.project_manager:
+            messagebox.showerror("错误", "请先创建或打开工程")
+            return
+        source_folder = filedialog.askdirectory(title="选择要同步的小说文件夹")
+        if not source_folder:
+            return
 
-        if existing_novel:
-            # 进行更新检测
-            updated, new_md5 = detect_updates(existing_novel, new_path)
+        def on_done(summary):
+            self.refresh_novel_list()
+            messagebox.showinfo(
+                "同步完成",
+                f"新增 {len(summary['added'])} 本，更新 {len(summary['updated'])} 本，"
+                f"移除 {len(summary['removed'])} 本，无变化 {len(summary['unchanged'])} 本，失败 {len(summary['failed'])} 本"
+            )
 
-            if updated:
-                messagebox.showinfo("检测到更新", f"《{existing_novel['name']}》有更新，正在更新……")
+        self.run_task("同步", sync_folder, self.project_manager, source_folder, on_done=on_done)
 
-                # 复制新文件到工程文件夹
-                project_path = os.path.join(self.project_manager.project_path, "novels")
-                file_path = copy_file_to_path(new_path, project_path)  # 复制新文件
+    def run_task(self, description, func, *args, on_done=None, **kwargs):
+        """
+        在后台线程中执行耗时操作，期间界面保持响应并显示进度。
 
-                if file_path:
-                    # 更新 MD5 和路径
-                    existing_novel["md5"] = new_md5
-                    existing_novel["path"] = file_path  
+        :param description: 显示在进度栏的任务名称
+        :param func: 要执行的函数，需接受 progress 关键字参数
+        :param on_done: 完成后在主线程中执行的回调 on_done(结果)
+        """
+        if self.current_task:
+            messagebox.showinfo("提示", "请等待当前任务完成")
+            return
 
-                    # 保存工程
-                    self.project_manager.save_project()
-                    self.refresh_novel_list()
-            else:
-                messagebox.showinfo("提示", f"《{existing_novel['name']}》无变化")
+        def finish():
+            self.current_task = None
+            self.status_var.set("")
+            self.btn_cancel_task.configure(state="disabled")
+            for button in self.action_buttons:
+                button.configure(state="normal")
 
-        else:
-            # 复制新小说到工程
-            project_path = os.path.join(self.project_manager.project_path, "novels")
-            file_path = copy_file_to_path(new_path, project_path)
+        def handle_done(result):
+            finish()
+            if on_done:
+                on_done(result)
 
-            if file_path:
-                # 添加小说信息
-                self.project_manager.add_novel(file_path)
-                self.refresh_novel_list()
+        def handle_error(error):
+            finish()
+            messagebox.showerror("错误", f"{description}过程中发生错误：{str(error)}")
+
+        def handle_cancel():
+            finish()
+            self.refresh_novel_list()
+            self.status_var.set(f"{description}已取消")
+
+        for button in self.action_buttons:
+            button.configure(state="disabled")
+        self.btn_cancel_task.configure(state="normal")
+        self.status_var.set(f"{description}中……")
+        self.current_task = self.task_runner.submit(
+            func, *args, on_done=handle_done, on_error=handle_error, on_cancel=handle_cancel,
+            on_progress=lambda done, total: self.show_progress(description, done, total), **kwargs
+        )
 
+    def cancel_task(self):
+        """请求取消当前后台任务"""
+        if self.current_task:
+            self.current_task.cancel()
+            self.status_var.set("正在取消……")
+
+    def show_progress(self, description, done, total):
+        """在按钮栏显示后台任务进度"""
+        self.status_var.set(f"{description}中 {done}/{total}")
 
     def refresh_novel_list(self):
         """
         刷新小说列表的函数。
-        此函数会清空当前显示的小说列表，然后从项目管理器中获取最新的小说信息，并将其添加到小说列表的树形视图中。
+        只对比当前显示的条目与项目管理器中的小说：删除已移除的、插入新增的，而不是清空后整个重建。
         """
-        # 清空小说列表树形视图中的所有现有条目
-        # self.novel_tree.get_children() 会返回树形视图中所有子项的标识符
-        # * 是解包操作符，将这些标识符作为参数传递给 delete 方法，从而删除所有子项
-        self.novel_tree.delete(*self.novel_tree.get_children())
-
-        # 检查项目管理器是否已经初始化
-        if self.project_manager:
-            # 遍历项目管理器中获取的所有小说信息
-            for novel in self.project_manager.get_novels():
-                # 在小说列表树形视图中插入一个新的条目
-                # "" 表示插入到根节点下
-                # "end" 表示将新条目添加到列表的末尾
-                # novel["name"] 是该条目的唯一标识符
-                # text=novel["name"] 表示在树形视图中显示的文本为小说的名称
-                self.novel_tree.insert("", "end", novel["name"], text=novel["name"])
+        # 小说名作为条目的唯一标识符，同时也是显示的文本
+        novels = self.project_manager.get_novels() if self.project_manager else []
+        sync_tree_items(self.novel_tree, [(novel.name, novel.name) for novel in novels])
 
     def load_chapters(self, event):
         """加载选中的小说章节，并自动展开章节列表"""
@@ -217,52 +310,72 @@ class NovelManagerGUI:
             print("无法获取小说名称")  # 调试信息
             return
         
-        novel_path = next((n["path"] for n in self.project_manager.get_novels() if n["name"] == novel_name), None)
+        novel = self.project_manager.get_novel(novel_name)
         
-        if not novel_path:
+        if not novel:
             print(f"未找到小说路径: {novel_name}")  # 调试信息
             return
 
-        chapters = extract_chapters(novel_path)
-        self.chapter_tree.delete(*self.chapter_tree.get_children())
+        # 章节索引缺失时需要扫描整本小说，放到后台线程中进行；切换小说时取消上一次的扫描
+        if self.chapter_task:
+            self.chapter_task.cancel()
+        self.chapter_loader.load([])
+        path, md5 = novel.path, novel.md5  # 在界面线程中取快照，后台导入可能同时修改这条记录
+        self.chapter_task = self.task_runner.submit(
+            lambda progress: self.project_manager.chapter_index.get_chapters(path, md5, progress),
+            on_done=lambda chapters: self.show_chapters(novel_name, chapters),
+            on_error=lambda e: print(f"章节加载失败: {e}"),
+        )
+
+    def show_chapters(self, novel_name, chapters):
+        """在章节列表中显示章节（仅当该小说仍处于选中状态）"""
+        selected = self.novel_tree.selection()
+        if not selected or self.novel_tree.item(selected[0], "text") != novel_name:
+            return
+        self.chapter_task = None
 
-        for ch in chapters:
-            chapter_id = self.chapter_tree.insert("", "end", text=ch["title"], values=(ch["start_line"],))
-            self.chapter_tree.see(chapter_id)  # 让章节可见
+        # 以章节序号作为条目标识，显示内容时可直接定位；分批插入，不逐行滚动
+        self.chapter_loader.load([(str(i), ch["title"], (ch["start_line"],)) for i, ch in enumerate(chapters)])
 
 
     def display_content(self, event):
         """显示选中的章节内容"""
         selected_item = self.chapter_tree.selection()
-       # print(f"选中的项目{selected_item}")
         if not selected_item:
             return
 
-        chapter_title = self.chapter_tree.item(selected_item, "text")
-        #print(chapter_title)
         novel_name = self.novel_tree.item(self.novel_tree.selection(), "text").strip()
-        #print(novel_name)
-
-        novel_path = next((n["path"] for n in self.project_manager.get_novels() if n["name"] == novel_name), None)
-       # print(novel_path)
-        if not novel_path:
-            return
-
-        chapters = extract_chapters(novel_path)
-        chapter_index = next((i for i, ch in enumerate(chapters) if ch["title"] == chapter_title), None)
-        if chapter_index is None:
+        novel = self.project_manager.get_novel(novel_name)
+        if not novel:
             return
+        self.load_chapter_text(novel, int(selected_item[0]))
 
-        with open(novel_path, "r", encoding="utf-8") as f:
-            content = f.readlines()
-
-        start_line = chapters[chapter_index]["start_line"]
-        end_line = chapters[chapter_index + 1]["start_line"] if chapter_index + 1 < len(chapters) else len(content)
-        chapter_text = "".join(content[start_line:end_line])
-
-        self.text_area.delete("1.0", tk.END)
-        self.text_area.insert("1.0", chapter_text)
-        
+    def load_chapter_text(self, novel, chapter_index):
+        """
+        在后台读取章节正文并显示（章节索引缺失时需要扫描整本小说）。
+        只显示最后一次请求的结果，新的请求会取消尚未完成的旧请求。
+        """
+        path, md5 = novel.path, novel.md5  # 在界面线程中取快照，后台导入可能同时修改这条记录
+        if self.content_task:
+            self.content_task.cancel()
+
+        def read(progress):
+            chapters = self.project_manager.chapter_index.get_chapters(path, md5, progress)
+            if chapter_index >= len(chapters):
+                return None
+            # 按字节偏移只读取当前章节（优先使用缓存），并在后台预读前后章节
+            return self.chapter_cache.read(path, md5, chapters, chapter_index)
+
+        def show(chapter_text):
+            if task is not self.content_task:
+                return
+            self.content_task = None
+            if chapter_text is not None:
+                self.text_loader.load(chapter_text)
+
+        task = self.content_task = self.task_runner.submit(
+            read, on_done=show, on_error=lambda e: print(f"章节读取失败: {e}")
+        )
 
     def merge_novels(self):
         """合并选定的小说并保存到一个TXT文件"""
@@ -270,12 +383,8 @@ class NovelManagerGUI:
             messagebox.showerror("错误", "请先创建或打开工程")
             return
 
-        # 获取工程根目录路径和文件夹名字
-        project_root_path = self.project_manager.project_path
-        project_folder_name = os.path.basename(project_root_path)
-
-        # 构建保存路径
-        save_path = os.path.join(project_root_path, f"{project_folder_name}.txt")
+        # 构建保存路径（工程根目录下以工程文件夹命名）
+        save_path = self.project_manager.get_merge_output_path()
         if not save_path:
             return
 
@@ -285,63 +394,82 @@ class NovelManagerGUI:
             messagebox.showerror("错误", "当前工程没有可合并的小说")
             return
 
-        try:
-            with open(save_path, "w", encoding="utf-8") as output_file:
-                chapter_counter = 1  # 全局章节编号
-
-                # 按顺序遍历每个小说
-                for novel in sorted(novels, key=lambda n: n.get("order", 0)):
-                    novel_path = novel["path"]
-                    novel_name = novel["name"]
-
-                    with open(novel_path, "r", encoding="utf-8") as f:
-                        content = f.readlines()
-                        chapters = extract_chapters(novel_path)
-
-                        # 遍历当前小说的每个章节
-                        for i, chapter in enumerate(chapters):
-                            raw_title = chapter["title"].strip()
-
-                            # 处理章节标题格式
-                            match = re.match(r"^第(\d+)章\s*(.*)", raw_title)
-                            if match:
-                                chapter_num = match.group(1)
-                                chapter_name = match.group(2).strip()
-                                # 判断是否有章节名称
-                                if chapter_name:
-                                    processed_title = chapter_name
-                                else:
-                                    processed_title = f"第{chapter_num}章"
-                            else:
-                                processed_title = raw_title  # 保留非标准格式的标题
-
-                            # 构建新章节标题
-                            new_header = f"第{chapter_counter}章-{novel_name}-{processed_title}\n"
-                            
-                            # 确定内容范围（跳过原章节标题行）
-                            start_line = chapter["start_line"]
-                            content_start = start_line + 1  # 跳过原标题行
-                            
-                            # 计算结束行
-                            if i + 1 < len(chapters):
-                                end_line = chapters[i+1]["start_line"]
-                            else:
-                                end_line = len(content)
-                            
-                            # 提取章节内容（排除原标题行）
-                            chapter_content = content[content_start:end_line]
-
-                            # 写入新标题和内容
-                            output_file.write(new_header)
-                            output_file.writelines(chapter_content)
-                            output_file.write("\n\n")  # 章节间空两行
-
-                            chapter_counter += 1
-
-            messagebox.showinfo("成功", f"合并完成，文件保存至：{save_path}")
-
-        except Exception as e:
-            messagebox.showerror("错误", f"合并过程中发生错误：{str(e)}")
+        # 在后台检查近似重复（每组只保留合并顺序最靠前的一本），有重复时询问是否跳过，然后再合并
+        merge_order = self.project_manager.get_merge_order()
+        project_manager = self.project_manager
+
+        def check(progress=None):
+            return filter_duplicate_novels(project_manager, merge_order)
+
+        def confirm(result):
+            kept, skipped = result
+            order = merge_order
+            if skipped:
+                names = "\n".join(f"{novel.name}（与 {original.name} 相似度 {score:.0%}）" for novel, original, score in skipped[:10])
+                more = f"\n……共 {len(skipped)} 本" if len(skipped) > 10 else ""
+                if messagebox.askyesno("发现近似重复", f"以下小说与合并顺序靠前的小说近似重复，是否跳过？\n{names}{more}"):
+                    order = kept
+
+            # 按顺序流式合并每个小说（未变化的小说复用上次合并的片段），在后台线程中执行
+            self.run_task(
+                "合并", merge_novel_files, order, save_path,
+                on_done=lambda chapters: messagebox.showinfo("成功", f"合并完成，文件保存至：{save_path}")
+            )
+
+        self.run_task("检查近似重复", check, on_done=confirm)
+
+    def search_novels(self):
+        """在工程的所有小说中搜索；有小说尚未建立搜索索引时先建立"""
+        if not self.project_manager:
+            messagebox.showerror("错误", "请先创建或打开工程")
+            return
+        query = self.search_var.get().strip()
+        if not query:
+            return
+
+        # 先为尚未建立搜索索引的小说建立索引（没有时立即返回），再查询并核对结果，全部在后台线程中执行
+        project_manager = self.project_manager
+
+        def search(progress=None):
+            build_search_index(project_manager, progress=progress)
+            return search_project(project_manager, query, verify=True)
+
+        self.run_task("搜索", search, on_done=lambda hits: self.show_search_results(query, hits))
+
+    def show_search_results(self, query, hits):
+        """在新窗口中列出搜索结果，双击结果显示对应章节"""
+        if not hits:
+            messagebox.showinfo("搜索", f"没有找到“{query}”")
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title(f"搜索“{query}”：{len(hits)} 个结果")
+        window.geometry("900x400")
+        tree = ttk.Treeview(window, columns=("title", "snippet"), show="tree headings")
+        tree.heading("#0", text="小说")
+        tree.heading("title", text="章节")
+        tree.heading("snippet", text="摘要")
+        tree.column("#0", width=200)
+        tree.column("title", width=200)
+        tree.column("snippet", width=500)
+        scroll = ttk.Scrollbar(window, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scroll.set)
+        scroll.pack(side="right", fill="y")
+        tree.pack(side="left", fill="both", expand=True)
+
+        for i, hit in enumerate(hits):
+            tree.insert("", "end", str(i), text=hit["novel"], values=(hit["title"], hit["snippet"] or ""))
+        tree.bind("<Double-1>", lambda event: self.open_search_hit(hits[int(tree.focus())]) if tree.focus() else None)
+
+    def open_search_hit(self, hit):
+        """选中结果所在的小说，并直接显示命中的章节"""
+        novel = self.project_manager.get_novel(hit["novel"])
+        if not novel:
+            return
+        if self.novel_tree.exists(novel.name):
+            self.novel_tree.selection_set(novel.name)
+            self.novel_tree.see(novel.name)
+        self.load_chapter_text(novel, hit["chapter"])
 
     def delete_selected_novel(self):
         if not self.project_manager:
@@ -368,8 +496,8 @@ class NovelManagerGUI:
             success = self.project_manager.remove_novel(novel_name)
             if success:
                 # 清除相关显示
-                self.chapter_tree.delete(*self.chapter_tree.get_children())
-                self.text_area.delete("1.0", tk.END)
+                self.chapter_loader.load([])
+                self.text_loader.clear()
                 # 刷新列表
                 self.refresh_novel_list()
                 messagebox.showinfo("成功", "小说已从工程移除")
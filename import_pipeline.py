@@ -0,0 +1,207 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from file_utils import ingest_file, file_fingerprint, detect_updates, replace_spaces_in_filename
+from search_index import write_postings_file, read_postings_file
+from similarity import novel_signatures
+
+
+def ingest_stable_file(source_path, output_path, attempts=2):
+    """
+    导入一个源文件，并确认读取期间文件没有被修改：读取前后的大小和修改时间不同时重新读取，
+    多次仍不一致则报错。这样记录的指纹（大小、修改时间）与完整哈希一定来自同一份内容。
+
+    :return: (ingest_file 的结果, 读取前的 os.stat 结果)
+    """
+    for _ in range(attempts):
+        before = os.stat(source_path)
+        ingested = ingest_file(source_path, output_path)
+        after = os.stat(source_path)
+        if (before.st_size, before.st_mtime_ns) == (after.st_size, after.st_mtime_ns):
+            return ingested, before
+    raise ValueError(f"{source_path} 在读取过程中被修改")
+
+
+def prepare_novel(source_path, novels_folder):
+    """
+    在工作进程中预处理一本小说：只读取一遍源文件，同时完成 UTF-8 转码、MD5 计算和章节扫描，
+    结果写入工程小说目录下的临时文件，由 commit_prepared_novels 原子替换到位。
+    搜索索引的倒排记录也在这里计算，写入临时文件，提交时再写入 search.db；
+    近似重复检测的签名体积很小，直接随结果返回，提交时写入 signatures.db。
+
+    :param source_path: 外部小说文件路径
+    :param novels_folder: 工程小说目录
+    :return: 预处理结果字典，失败时包含 error
+    """
+    filename = replace_spaces_in_filename(os.path.basename(source_path))
+    fd, temp_path = tempfile.mkstemp(prefix=".import-", suffix=".part", dir=novels_folder)
+    os.close(fd)
+    postings_path = temp_path + ".postings"
+    try:
+        ingested, stat = ingest_stable_file(source_path, temp_path)
+        write_postings_file(temp_path, ingested["chapters"], postings_path)
+        signatures = novel_signatures(temp_path, ingested["chapters"])
+        fingerprint = file_fingerprint(source_path, full_hash=ingested["source_hash"], stat=stat)
+    except Exception as e:
+        discard_prepared([{"temp_path": temp_path, "postings_path": postings_path}])
+        return {"source": source_path, "error": str(e)}
+    return {
+        "source": source_path,
+        "filename": filename,
+        "temp_path": temp_path,
+        "postings_path": postings_path,
+        "md5": ingested["md5"],
+        "fingerprint": fingerprint,
+        "chapters": ingested["chapters"],
+        "signatures": signatures,
+    }
+
+
+def prepare_novels(source_paths, novels_folder, jobs=None, progress=None):
+    """
+    并行预处理多本小说。
+
+    :param source_paths: 外部小说文件路径列表
+    :param novels_folder: 工程小说目录
+    :param jobs: 工作进程数，默认使用 CPU 核数；为 1 或只有一个文件时在当前进程处理
+    :param progress: 进度回调 progress(已完成数, 总数)
+    :return: 与 source_paths 顺序一致的预处理结果列表
+    """
+    total = len(source_paths)
+    results = [None] * total
+
+    if jobs == 1 or total <= 1:
+        try:
+            for i, source_path in enumerate(source_paths):
+                results[i] = prepare_novel(source_path, novels_folder)
+                if progress:
+                    progress(i + 1, total)
+        except BaseException:
+            discard_prepared(r for r in results if r)
+            raise
+        return results
+
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    futures = {executor.submit(prepare_novel, path, novels_folder): i for i, path in enumerate(source_paths)}
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = {"source": source_paths[i], "error": str(e)}
+            if progress:
+                progress(done, total)
+    except BaseException:
+        # 被取消或出错：取消尚未开始的任务，等待正在运行的任务结束后清理其临时文件
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+        discard_prepared(f.result() for f in futures if f.done() and not f.cancelled() and f.exception() is None)
+        raise
+    executor.shutdown()
+    return results
+
+
+def discard_prepared(results):
+    """删除预处理结果留下的临时文件"""
+    for result in results:
+        for key in ("temp_path", "postings_path"):
+            path = result.get(key)
+            if path and os.path.exists(path):
+                os.remove(path)
+
+
+def filter_unchanged_sources(project_manager, source_paths):
+    """
+    用源文件指纹快速排除未变化的文件，无需读取文件内容。
+
+    :return: (需要导入的路径列表, 未变化的小说名列表, 是否刷新了指纹)
+    """
+    pending = []
+    unchanged = []
+    refreshed = False
+    for source_path in source_paths:
+        filename = replace_spaces_in_filename(os.path.basename(source_path))
+        existing_novel = project_manager.find_novel_by_filename(filename)
+        if existing_novel:
+            updated, fingerprint = detect_updates(existing_novel, source_path)
+            if not updated:
+                if fingerprint != existing_novel.source:
+                    existing_novel.source = fingerprint  # 内容未变，只刷新修改时间或（源文件夹移动后的）路径
+                    project_manager.mark_changed(existing_novel)
+                    refreshed = True
+                unchanged.append(existing_novel.name)
+                continue
+        pending.append(source_path)
+    return pending, unchanged, refreshed
+
+
+def commit_prepared_novels(project_manager, results, changed=False):
+    """
+    将预处理结果写入工程：新小说加入工程，有变化的小说更新，最后只保存一次工程。
+
+    :param changed: 调用方是否已修改过工程（为 True 时即使没有新结果也会保存）
+    :return: 导入汇总 {"added", "updated", "unchanged", "failed"}，每项为小说名列表
+    """
+    summary = {"added": [], "updated": [], "unchanged": [], "failed": []}
+    novels_folder = os.path.join(project_manager.project_path, "novels")
+
+    for result in results:
+        if "error" in result:
+            summary["failed"].append(os.path.basename(result["source"]))
+            continue
+
+        new_filename = result["filename"]
+        source = result["fingerprint"]
+
+        # 查找同名小说（基于文件名匹配，空格替换后）
+        existing_novel = project_manager.find_novel_by_filename(new_filename)
+
+        if existing_novel and existing_novel.md5 == result["md5"]:
+            discard_prepared([result])
+            if existing_novel.source != source:
+                existing_novel.source = source  # 记录新的源文件信息
+                project_manager.mark_changed(existing_novel)
+                changed = True
+            summary["unchanged"].append(existing_novel.name)
+            continue
+
+        # 临时文件与目标在同一目录，直接原子替换
+        target_path = os.path.join(novels_folder, new_filename)
+        os.replace(result["temp_path"], target_path)
+
+        if existing_novel:
+            project_manager.update_novel(existing_novel, target_path, result["md5"], source=source, save=False)
+            summary["updated"].append(existing_novel.name)
+        else:
+            project_manager.add_novel(target_path, md5=result["md5"], source=source, save=False)
+            summary["added"].append(os.path.basename(target_path))
+        project_manager.chapter_index.put(target_path, result["md5"], result["chapters"], save=False)
+        if not project_manager.search_index.has(result["md5"]):
+            postings = read_postings_file(result["postings_path"])
+            project_manager.search_index.add(result["md5"], postings, len(result["chapters"]))
+        os.remove(result["postings_path"])
+        if not project_manager.signature_store.has(result["md5"]):
+            project_manager.signature_store.add(result["md5"], *result["signatures"])
+        changed = True
+
+    if changed:
+        project_manager.save_project()
+        project_manager.chapter_index.save()
+    return summary
+
+
+def import_novels(project_manager, source_paths, jobs=None, progress=None):
+    """批量导入小说：先用指纹跳过未变化的文件，其余并行完成单次读取的转码、哈希和章节扫描，然后一次性提交到工程"""
+    novels_folder = os.path.join(project_manager.project_path, "novels")
+    os.makedirs(novels_folder, exist_ok=True)
+    pending, unchanged, refreshed = filter_unchanged_sources(project_manager, source_paths)
+    results = prepare_novels(pending, novels_folder, jobs=jobs, progress=progress)
+    try:
+        summary = commit_prepared_novels(project_manager, results, changed=refreshed)
+        summary["unchanged"] = unchanged + summary["unchanged"]
+        return summary
+    finally:
+        # 清理提交失败时残留的临时文件
+        discard_prepared(results)
@@ -0,0 +1,201 @@
+"""
+性能计时与计数：统计导入、合并等关键函数的调用次数、耗时，以及读写字节数、文件数、章节数和章节缓存命中数，
+可输出每次运行的 JSON 报告，并可选用 cProfile 保存完整的性能剖析数据。
+
+未启用时不做任何包装，被统计的函数保持原样，没有额外开销；enable() 时才替换各模块中对这些函数的引用，
+disable() 时恢复（统计期间才导入的模块会保留包装函数，停用后包装函数直接调用原函数，不再计数）。
+文件数、读写字节数、章节数只记在实际读写文件的底层函数上，外层函数（例如 import_novels）只统计调用次数和耗时，
+因此 totals 中的合计不会重复计算嵌套调用。多进程导入、合并时工作进程中的调用不计入（只统计到调用它们的 import_novels、
+merge_novel_files 等整体耗时），需要逐项分解时请使用单进程（--jobs 1）。
+"""
+import os
+import sys
+import json
+import time
+import cProfile
+import importlib
+import threading
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _size(path):
+    """文件大小，文件不存在时为 0"""
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+def _novels_size(novels):
+    """小说文件大小之和"""
+    return sum(_size(novel.path) for novel in novels)
+
+
+# (模块, 函数或“类.方法”, 计数函数 counters(args, kwargs, result) -> {计数名: 数值})
+# 计数函数只用于不再调用其他带计数函数的底层函数，其余函数为 None
+TARGETS = [
+    ("file_utils", "compute_md5", lambda a, k, r: {"files": 1, "bytes_read": _size(a[0])}),
+    ("file_utils", "detect_encoding", None),
+    ("file_utils", "convert_to_utf8", lambda a, k, r: {"files": 1, "bytes_read": _size(a[0]), "bytes_written": _size(r)}),
+    # 复制本身的读写；文件数和转码的读写由其中调用的 convert_to_utf8 计入
+    ("file_utils", "copy_file_to_path", lambda a, k, r: {"bytes_read": _size(a[0]), "bytes_written": _size(a[0]) if r else 0}),
+    ("file_utils", "extract_chapters", lambda a, k, r: {"files": 1, "bytes_read": _size(a[0]), "chapters": len(r)}),
+    ("file_utils", "ingest_file", lambda a, k, r: {
+        "files": 1, "bytes_read": _size(a[0]), "bytes_written": _size(a[1]), "chapters": len(r["chapters"])
+    }),
+    ("file_utils", "read_chapter", lambda a, k, r: {"bytes_read": max(a[1]["end"] - a[1]["offset"], 0)}),
+    ("chapter_cache", "ChapterTextCache.get", lambda a, k, r: {"cache_hits": r is not None, "cache_misses": r is None}),
+    ("project_manager", "ProjectManager.load_project", None),
+    ("project_manager", "ProjectManager.save_project", None),
+    ("import_pipeline", "import_novels", None),
+    ("merge_engine", "merge_novel_files", lambda a, k, r: {
+        "files": len(a[0]), "bytes_read": _novels_size(a[0]), "bytes_written": _size(a[1]), "chapters": r
+    }),
+    ("merge_output", "merge_novel_volumes", lambda a, k, r: {
+        "files": len(a[0]), "bytes_read": _novels_size(a[0]),
+        "bytes_written": sum(v["size"] for v in r), "chapters": sum(v["chapter_count"] for v in r)
+    }),
+    # 合并的各个步骤只计时，用于区分扫描改写小说、拼接片段和复制上次结果的耗时（读写量记在上面的合并函数上）
+    ("merge_engine", "write_novel_segment", None),
+    ("merge_engine", "render_novel_part", None),
+    ("merge_engine", "write_rendered_part", None),
+    ("merge_engine", "_copy_old_segment", None),
+    ("search_index", "write_postings_file", lambda a, k, r: {"bytes_read": _size(a[0]), "bytes_written": _size(a[2])}),
+    ("search_index", "search_project", lambda a, k, r: {"hits": len(r)}),
+    ("similarity", "novel_signatures", lambda a, k, r: {"bytes_read": _size(a[0])}),
+]
+
+_lock = threading.Lock()
+_stats = {}  # 名称 -> {"calls", "seconds", 各计数}
+_patched = []  # [(对象, 属性名, 原值)]，停用时按相反顺序恢复
+_profiler = None
+_started = None  # 开始统计的时间
+_enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def record(name, seconds, counters=None):
+    """记录一次调用（也可用于统计没有列在 TARGETS 中的阶段）"""
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            _stats[name] = stat = {"calls": 0, "seconds": 0.0}
+        stat["calls"] += 1
+        stat["seconds"] += seconds
+        for key, value in (counters or {}).items():
+            stat[key] = stat.get(key, 0) + int(value)
+
+
+def _wrap(name, func, counter):
+    def wrapper(*args, **kwargs):
+        if not _enabled:  # 停用后仍被其他模块引用的包装函数
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        counters = None
+        if counter:
+            try:
+                counters = counter(args, kwargs, result)
+            except Exception:  # 计数失败（例如返回了 None）不影响被统计的函数
+                counters = None
+        record(name, seconds, counters)
+        return result
+
+    wrapper.__wrapped__ = func
+    wrapper.__name__ = getattr(func, "__name__", name)
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def _patch(owner, attr, value):
+    _patched.append((owner, attr, owner.__dict__[attr]))
+    setattr(owner, attr, value)
+
+
+def enable(profile=False):
+    """
+    开始统计：包装 TARGETS 中的函数，并替换本项目各模块中通过 from ... import 得到的引用。
+
+    :param profile: 是否同时启用 cProfile（只剖析当前线程）
+    """
+    global _profiler, _started, _enabled
+    if _enabled:
+        return
+    reset()
+    for module_name, qualname, counter in TARGETS:
+        module = importlib.import_module(module_name)
+        owner_name, _, attr = qualname.rpartition(".")
+        owner = getattr(module, owner_name) if owner_name else module
+        original = owner.__dict__[attr]
+        wrapper = _wrap(qualname, original, counter)
+        _patch(owner, attr, wrapper)
+        if owner_name:
+            continue
+        for other in list(sys.modules.values()):
+            other_file = getattr(other, "__file__", None)
+            if other is module or not other_file or os.path.dirname(os.path.abspath(other_file)) != PACKAGE_DIR:
+                continue
+            for name, value in list(vars(other).items()):
+                if value is original:
+                    _patch(other, name, wrapper)
+    _started = time.time()
+    _enabled = True
+    if profile:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def disable():
+    """停止统计并恢复所有被包装的函数（已收集的数据保留，可继续输出报告）"""
+    global _enabled
+    if _profiler:
+        _profiler.disable()
+    while _patched:
+        owner, attr, original = _patched.pop()
+        setattr(owner, attr, original)
+    _enabled = False
+
+
+def reset():
+    global _profiler
+    with _lock:
+        _stats.clear()
+    _profiler = None
+
+
+def report():
+    """
+    :return: {"started", "stages": {名称: {"calls", "seconds", 计数...}}, "totals": {计数名: 合计}}
+             耗时为包含内部调用的时间；计数只记在底层函数上，totals 为各底层函数计数之和
+    """
+    with _lock:
+        stages = {name: dict(stat, seconds=round(stat["seconds"], 6)) for name, stat in _stats.items()}
+    totals = {}
+    for stat in stages.values():
+        for key, value in stat.items():
+            if key not in ("calls", "seconds"):
+                totals[key] = totals.get(key, 0) + value
+    return {
+        "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(_started)) if _started else None,
+        "stages": dict(sorted(stages.items(), key=lambda item: -item[1]["seconds"])),
+        "totals": totals,
+    }
+
+
+def write_report(path):
+    """把 report() 写入 JSON 文件"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report(), f, ensure_ascii=False, indent=4)
+
+
+def dump_profile(path):
+    """保存 cProfile 数据（可用 python -m pstats 或 snakeviz 查看），未启用剖析时返回 False"""
+    if not _profiler:
+        return False
+    _profiler.dump_stats(path)
+    return True
@@ -0,0 +1,109 @@
+import tkinter as tk
+
+
+class BatchedTreeLoader:
+    """
+    分批向 Treeview 插入大量条目：每次只插入 batch_size 行，其余通过 root.after 在后续空闲时插入，
+    避免一次性插入数万行（以及逐行 see()）造成界面长时间卡顿。
+    """
+
+    def __init__(self, root, tree, batch_size=500):
+        self.root = root
+        self.tree = tree
+        self.batch_size = batch_size
+        self._job = None  # 尚未执行的 after 任务
+        self._items = []
+        self._position = 0
+
+    def load(self, items):
+        """
+        清空列表并开始分批插入。
+
+        :param items: (iid, text, values) 序列
+        """
+        self.cancel()
+        self.tree.delete(*self.tree.get_children())
+        self._items = items
+        self._position = 0
+        self._insert_batch()
+
+    def cancel(self):
+        """停止尚未完成的插入"""
+        if self._job:
+            self.root.after_cancel(self._job)
+            self._job = None
+
+    def _insert_batch(self):
+        end = min(self._position + self.batch_size, len(self._items))
+        for iid, text, values in self._items[self._position:end]:
+            self.tree.insert("", "end", iid, text=text, values=values)
+        self._position = end
+        if end < len(self._items):
+            self._job = self.root.after(1, self._insert_batch)
+        else:
+            self._job = None
+            self._items = []
+
+
+def sync_tree_items(tree, items):
+    """
+    增量刷新 Treeview：只删除消失的条目、插入新条目、更新文本变化的条目，
+    顺序不同时才移动，避免每次都清空重建整个列表。
+
+    :param tree: Treeview
+    :param items: 按显示顺序排列的 (iid, text) 序列
+    """
+    wanted = dict(items)
+    existing = tree.get_children()
+
+    stale = [iid for iid in existing if iid not in wanted]
+    if stale:
+        tree.delete(*stale)
+
+    current = set(existing) - set(stale)
+    for index, (iid, text) in enumerate(items):
+        if iid not in current:
+            tree.insert("", index, iid, text=text)
+        elif tree.item(iid, "text") != text:
+            tree.item(iid, text=text)
+
+    if list(tree.get_children()) != [iid for iid, _ in items]:
+        for index, (iid, _) in enumerate(items):
+            tree.move(iid, "", index)
+
+
+class ProgressiveTextLoader:
+    """分段向 Text 控件写入长文本：先显示第一段，其余在后续空闲时追加"""
+
+    def __init__(self, root, text_widget, chunk_size=20000):
+        self.root = root
+        self.text_widget = text_widget
+        self.chunk_size = chunk_size  # 每次插入的字符数
+        self._job = None
+        self._text = ""
+        self._position = 0
+
+    def load(self, text):
+        """替换显示内容"""
+        self.clear()
+        self._text = text
+        self._insert_chunk()
+
+    def clear(self):
+        """清空内容并停止尚未完成的追加"""
+        if self._job:
+            self.root.after_cancel(self._job)
+            self._job = None
+        self._text = ""
+        self._position = 0
+        self.text_widget.delete("1.0", tk.END)
+
+    def _insert_chunk(self):
+        end = self._position + self.chunk_size
+        self.text_widget.insert(tk.END, self._text[self._position:end])
+        self._position = end
+        if self._position < len(self._text):
+            self._job = self.root.after(1, self._insert_chunk)
+        else:
+            self._job = None
+            self._text = ""
@@ -1,8 +1,25 @@
 # main.py - 主入口
-from tkinter import Tk
-from gui import NovelManagerGUI
+import os
+import sys
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # 带参数运行时使用命令行模式，不加载 Tk
+        from cli import main
+        sys.exit(main())
+
+    from tkinter import Tk
+    from gui import NovelManagerGUI
+
+    # 设置环境变量 NOVEL_STATS=<报告路径> 时统计界面操作的耗时和读写量，退出时写入 JSON 报告
+    stats_path = os.environ.get("NOVEL_STATS")
+    if stats_path:
+        import instrumentation
+        instrumentation.enable()
+
     root = Tk()
     app = NovelManagerGUI(root)
     root.mainloop()
+
+    if stats_path:
+        instrumentation.write_report(stats_path)
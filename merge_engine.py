@@ -0,0 +1,331 @@
+import os
+import json
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from chapter_parser import parse_chapter_header
+from merged_toc import write_toc, load_toc
+
+OUTPUT_BUFFER_SIZE = 1024 * 1024  # 输出缓冲区大小
+COPY_CHUNK_SIZE = 1024 * 1024  # 复用旧片段时每次复制的字节数
+NEWLINE = os.linesep.encode("ascii")  # 与文本模式写入一致的换行符
+MANIFEST_VERSION = 4  # 标题改写规则或片段记录变化时递增，使旧片段失效
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024  # 需要重新渲染的内容少于此大小时逐本合并（临时片段使每个字节多写一遍）
+
+
+def format_chapter_title(header):
+    """处理原章节标题：有章节名时只保留章节名，否则使用“第{原编号}章”"""
+    return header.name or f"第{header.number}章"
+
+
+def format_title_line(chapter_number, novel_name, processed_title):
+    """合并文件中的章节标题行：第{全局编号}章-{小说名}-{章节名}"""
+    return f"第{chapter_number}章-{novel_name}-{processed_title}".encode("utf-8") + NEWLINE
+
+
+def write_novel_segment(output_file, novel_name, novel_path, chapter_counter, toc=None):
+    """
+    逐行读取一本小说并写入合并文件，遇到章节标题时改写为全局编号的新标题。
+
+    :param output_file: 以二进制模式打开的输出文件
+    :param novel_name: 小说名（写入新标题）
+    :param novel_path: 小说文件路径（UTF-8）
+    :param chapter_counter: 本小说第一章的全局编号
+    :param toc: 目录列表，每章追加 (小说名, 原章节标题, 章节在输出文件中的偏移)
+    :return: 下一本小说第一章的全局编号
+    """
+    in_chapter = False  # 第一个章节标题之前的内容不写入
+    with open(novel_path, "rb") as f:
+        for raw_line in f:
+            header = parse_chapter_header(raw_line.decode("utf-8", errors="ignore"))
+            if header:
+                if in_chapter:
+                    output_file.write(NEWLINE * 2)  # 章节间空两行
+                if toc is not None:
+                    toc.append((novel_name, header.title, output_file.tell()))
+                output_file.write(format_title_line(chapter_counter, novel_name, format_chapter_title(header)))
+                chapter_counter += 1
+                in_chapter = True
+            elif in_chapter:
+                output_file.write(raw_line)
+    if in_chapter:
+        output_file.write(NEWLINE * 2)
+    return chapter_counter
+
+
+def render_novel_part(novel_path, part_path):
+    """
+    在工作进程中执行：扫描一本小说，把各章正文写入临时片段文件，章节标题单独返回。
+    标题中的全局编号要等前面所有小说的章节数确定后才知道，由最后的拼接步骤写入。
+
+    :return: ([(处理后的章节名, 原章节标题, 正文在片段中的起始偏移), ...], 片段总字节数)
+    """
+    titles = []
+    in_chapter = False
+    with open(novel_path, "rb") as f, open(part_path, "wb", buffering=OUTPUT_BUFFER_SIZE) as part:
+        for raw_line in f:
+            header = parse_chapter_header(raw_line.decode("utf-8", errors="ignore"))
+            if header:
+                if in_chapter:
+                    part.write(NEWLINE * 2)  # 章节间空两行（属于上一章的正文）
+                titles.append((format_chapter_title(header), header.title, part.tell()))
+                in_chapter = True
+            elif in_chapter:
+                part.write(raw_line)
+        if in_chapter:
+            part.write(NEWLINE * 2)
+        return titles, part.tell()
+
+
+def write_rendered_part(output_file, novel_name, part_path, titles, size, chapter_start, toc):
+    """把 render_novel_part 生成的片段按全局编号写入合并文件，与 write_novel_segment 的输出逐字节相同"""
+    with open(part_path, "rb") as part:
+        for i, (title, original_title, body_start) in enumerate(titles):
+            body_end = titles[i + 1][2] if i + 1 < len(titles) else size
+            toc.append((novel_name, original_title, output_file.tell()))
+            output_file.write(format_title_line(chapter_start + i, novel_name, title))
+            copy_byte_range(part, output_file, body_start, body_end - body_start)
+
+
+def manifest_path_for(save_path):
+    """合并结果对应的片段清单路径"""
+    return save_path + ".manifest.json"
+
+
+def load_manifest(save_path):
+    """
+    读取上次合并的片段清单；清单版本不符、合并文件不存在或已被改动（大小、修改时间不符）时返回 None。
+    """
+    manifest_path = manifest_path_for(save_path)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        stat = os.stat(save_path)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    if stat.st_size != manifest.get("output_size") or stat.st_mtime_ns != manifest.get("output_mtime_ns"):
+        return None
+    return manifest
+
+
+def save_manifest(save_path, segments):
+    """保存片段清单，同时记录合并文件的大小和修改时间用于下次校验"""
+    stat = os.stat(save_path)
+    manifest = {"version": MANIFEST_VERSION, "output_size": stat.st_size, "output_mtime_ns": stat.st_mtime_ns, "segments": segments}
+    manifest_path = manifest_path_for(save_path)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def copy_byte_range(source_file, output_file, offset, length):
+    """从旧合并文件复制一段字节到新文件"""
+    source_file.seek(offset)
+    while length > 0:
+        chunk = source_file.read(min(COPY_CHUNK_SIZE, length))
+        if not chunk:
+            raise IOError("旧合并文件比清单记录的短")
+        output_file.write(chunk)
+        length -= len(chunk)
+
+
+def _copy_old_segment(old_output, output_file, old, old_toc, novel_name, toc):
+    """复制旧片段的字节，并把旧目录中该片段各章的偏移平移到新位置"""
+    offset = output_file.tell()
+    copy_byte_range(old_output, output_file, old["offset"], old["length"])
+    first = old["chapter_start"] - 1
+    for i in range(first, first + old["chapter_count"]):
+        _, title = old_toc["chapters"][i]
+        toc.append((novel_name, title, old_toc["offsets"][i][0] - old["offset"] + offset))
+
+
+def _reusable_segment(old_segments, novel):
+    """返回内容未变化（MD5 相同）的旧片段"""
+    old = old_segments.get(novel.name)
+    if old and novel.md5 and old["md5"] == novel.md5:
+        return old
+    return None
+
+
+def _merge_serial(novels, output_file, old_segments, old_output, old_toc, toc, progress):
+    """在当前进程中逐本合并，直接写入输出文件"""
+    segments = []
+    chapter_counter = 1  # 全局章节编号
+    for novel in novels:
+        offset = output_file.tell()
+        old = _reusable_segment(old_segments, novel)
+        if old and old["chapter_start"] == chapter_counter:
+            _copy_old_segment(old_output, output_file, old, old_toc, novel.name, toc)
+            chapter_count = old["chapter_count"]
+        else:
+            chapter_count = write_novel_segment(output_file, novel.name, novel.path, chapter_counter, toc) - chapter_counter
+        segments.append({
+            "name": novel.name,
+            "md5": novel.md5,
+            "chapter_start": chapter_counter,
+            "chapter_count": chapter_count,
+            "offset": offset,
+            "length": output_file.tell() - offset,
+        })
+        chapter_counter += chapter_count
+        if progress:
+            progress(len(segments), len(novels))
+    return segments
+
+
+def _render_parts(batch, part_folder, jobs, rendered, on_rendered):
+    """
+    渲染一批小说的临时片段，只有一本时在当前进程中处理。
+
+    :param batch: [(在合并顺序中的位置, 小说记录), ...]
+    :param rendered: 渲染结果写入此 dict：小说名 -> (片段路径, 章节标题列表, 片段字节数)
+    :param on_rendered: 每渲染完一本调用一次（用于报告进度，可抛出异常中止）
+    """
+    if not batch:
+        return
+    parts = [(novel, os.path.join(part_folder, f"{position}.part")) for position, novel in batch]
+    if len(parts) == 1 or jobs == 1:
+        for novel, part_path in parts:
+            rendered[novel.name] = (part_path, *render_novel_part(novel.path, part_path))
+            on_rendered()
+        return
+
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        futures = {executor.submit(render_novel_part, novel.path, part_path): (novel, part_path) for novel, part_path in parts}
+        for future in as_completed(futures):
+            novel, part_path = futures[future]
+            rendered[novel.name] = (part_path, *future.result())
+            on_rendered()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _merge_parallel(novels, output_file, old_segments, old_output, old_toc, toc, jobs, progress, work_folder):
+    """
+    多进程合并：各工作进程同时扫描小说并把正文写入临时片段，章节标题随结果返回；
+    全部完成后按各小说的章节数算出全局起始编号，再按顺序拼接片段并写入标题。
+    """
+    total = len(novels)
+    done = 0
+
+    def on_rendered():
+        nonlocal done
+        done += 1
+        if progress:
+            progress(done, total)
+
+    rendered = {}
+    part_folder = tempfile.mkdtemp(prefix=".merge-parts-", dir=work_folder)
+    try:
+        # 第一轮：渲染内容有变化的小说；内容未变的小说章节数已知，暂不处理
+        changed = [(i, novel) for i, novel in enumerate(novels) if not _reusable_segment(old_segments, novel)]
+        _render_parts(changed, part_folder, jobs, rendered, on_rendered)
+
+        chapter_starts = []
+        chapter_counter = 1
+        for novel in novels:
+            chapter_starts.append(chapter_counter)
+            if novel.name in rendered:
+                chapter_counter += len(rendered[novel.name][1])
+            else:
+                chapter_counter += _reusable_segment(old_segments, novel)["chapter_count"]
+
+        # 第二轮：内容未变但起始编号移动了的小说，旧片段中的编号已失效，需要重新渲染
+        shifted = [
+            (i, novel) for i, novel in enumerate(novels)
+            if novel.name not in rendered and _reusable_segment(old_segments, novel)["chapter_start"] != chapter_starts[i]
+        ]
+        _render_parts(shifted, part_folder, jobs, rendered, on_rendered)
+
+        segments = []
+        for novel, chapter_start in zip(novels, chapter_starts):
+            offset = output_file.tell()
+            if novel.name in rendered:
+                part_path, titles, size = rendered[novel.name]
+                write_rendered_part(output_file, novel.name, part_path, titles, size, chapter_start, toc)
+                os.remove(part_path)  # 尽早释放临时片段占用的磁盘空间
+                chapter_count = len(titles)
+            else:
+                old = _reusable_segment(old_segments, novel)
+                _copy_old_segment(old_output, output_file, old, old_toc, novel.name, toc)
+                chapter_count = old["chapter_count"]
+                on_rendered()
+            segments.append({
+                "name": novel.name,
+                "md5": novel.md5,
+                "chapter_start": chapter_start,
+                "chapter_count": chapter_count,
+                "offset": offset,
+                "length": output_file.tell() - offset,
+            })
+        return segments
+    finally:
+        shutil.rmtree(part_folder, ignore_errors=True)
+
+
+def _should_merge_parallel(novels, old_segments, jobs):
+    """
+    判断是否值得使用多进程合并。多进程时每本小说先写入临时片段再复制到结果文件，每个字节要多写一遍，
+    只有需要重新渲染的小说足够多、足够大时并行扫描节省的时间才能抵消这部分开销。
+    """
+    if (jobs or os.cpu_count() or 1) == 1:
+        return False
+    changed = [novel for novel in novels if not _reusable_segment(old_segments, novel)]
+    if len(changed) < 2 or len(changed) * 2 < len(novels):  # 大部分片段可以直接复用
+        return False
+    size = 0
+    for novel in changed:
+        try:
+            size += os.path.getsize(novel.path)
+        except OSError:
+            pass
+        if size >= PARALLEL_MIN_BYTES:
+            return True
+    return False
+
+
+def merge_novel_files(novels, save_path, incremental=True, progress=None, jobs=None):
+    """
+    流式合并小说：每本小说只读取一遍，内存占用与小说大小无关。
+    增量模式下，内容（MD5）和起始章节编号都未变化的小说直接从上次的合并文件复制字节片段，不再重新处理。
+    需要重新渲染的内容较多时（见 _should_merge_parallel）各小说在工作进程中并行扫描、渲染为临时片段，最后按顺序拼接。
+    合并完成后写入章节目录（见 merged_toc），可按章节编号直接读取合并结果中的任意一章。
+
+    :param novels: 按合并顺序排列的小说记录（NovelRecord，使用 name、path、md5）
+    :param save_path: 合并结果保存路径
+    :param incremental: 是否复用上次合并的片段
+    :param progress: 进度回调 progress(已完成小说数, 小说总数)，抛出异常可中止合并
+    :param jobs: 工作进程数（默认使用全部 CPU 核），为 1 或需要渲染的内容较少时在当前进程中逐本合并
+    :return: 合并后的章节总数
+    """
+    manifest = load_manifest(save_path) if incremental else None
+    old_toc = load_toc(save_path) if manifest else None  # 复用旧片段时也需要旧目录中的章节偏移
+    old_segments = {seg["name"]: seg for seg in manifest["segments"]} if manifest and old_toc else {}
+    toc = []
+    old_output = open(save_path, "rb") if old_segments else None
+
+    temp_path = save_path + ".tmp"
+    try:
+        with open(temp_path, "wb", buffering=OUTPUT_BUFFER_SIZE) as output_file:
+            if not _should_merge_parallel(novels, old_segments, jobs):
+                segments = _merge_serial(novels, output_file, old_segments, old_output, old_toc, toc, progress)
+            else:
+                work_folder = os.path.dirname(os.path.abspath(save_path))  # 临时片段与结果放在同一磁盘
+                segments = _merge_parallel(
+                    novels, output_file, old_segments, old_output, old_toc, toc, jobs, progress, work_folder
+                )
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        if old_output:
+            old_output.close()
+
+    os.replace(temp_path, save_path)
+    save_manifest(save_path, segments)
+    write_toc(save_path, toc)
+    return sum(seg["chapter_count"] for seg in segments)
@@ -0,0 +1,246 @@
+"""
+压缩、分卷的合并输出：合并时直接流式压缩写入，并可按大小或章节数切分为多卷，各卷章节编号连续。
+"""
+import os
+import bz2
+import gzip
+import json
+import lzma
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from merge_engine import OUTPUT_BUFFER_SIZE, copy_byte_range, format_title_line, render_novel_part
+from project_store import write_json_atomic
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz", "zstd": ".zst"}
+
+
+def open_compressed(path, compression=None):
+    """
+    以二进制写模式打开输出文件。
+
+    :param compression: None、"gzip"、"bz2"、"xz" 或 "zstd"（需要 Python 3.14 的 compression.zstd 或 zstandard 库）
+    """
+    if compression is None:
+        return open(path, "wb", buffering=OUTPUT_BUFFER_SIZE)
+    if compression == "gzip":
+        return gzip.open(path, "wb", compresslevel=6)  # 默认的 9 级慢很多，压缩率提升很小
+    if compression == "bz2":
+        return bz2.open(path, "wb")
+    if compression == "xz":
+        return lzma.open(path, "wb", preset=6)
+    if compression == "zstd":
+        try:
+            from compression import zstd
+            return zstd.open(path, "wb")
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd 压缩需要 Python 3.14 或安装 zstandard 库")
+        return zstandard.ZstdCompressor().stream_writer(open(path, "wb"))
+    raise ValueError(f"未知的压缩格式: {compression}")
+
+
+def volume_paths_for(save_path, compression=None, split=False):
+    """
+    生成各卷的文件路径：不分卷时为 <合并文件><压缩后缀>，分卷时为 <文件名>.001<扩展名><压缩后缀> 依次编号。
+
+    :return: 函数 path_for(卷序号，从 1 开始)
+    """
+    suffix = COMPRESSION_SUFFIXES.get(compression, "")
+    if not split:
+        return lambda number: save_path + suffix
+    stem, ext = os.path.splitext(save_path)
+    return lambda number: f"{stem}.{number:03d}{ext}{suffix}"
+
+
+class VolumeWriter:
+    """
+    写入合并输出并在章节边界处切分卷。每卷先写入临时文件，全部完成后才替换为正式文件，
+    中途出错或取消时不会留下不完整的卷。
+    """
+
+    def __init__(self, save_path, compression=None, max_bytes=None, max_chapters=None):
+        """
+        :param max_bytes: 每卷的最大字节数（按未压缩的字节计算；单章超过该大小时独占一卷）
+        :param max_chapters: 每卷的最大章节数
+        """
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.max_chapters = max_chapters
+        self.path_for = volume_paths_for(save_path, compression, split=bool(max_bytes or max_chapters))
+        self.volumes = []  # 已完成的卷：{"path", "first_chapter", "chapter_count", "size"}
+        self.file = None
+        self.temp_path = None
+        self.written = 0  # 当前卷已写入的未压缩字节数
+        self.chapter_count = 0  # 当前卷的章节数
+        self.next_chapter = 1  # 下一章的全局编号
+
+    def begin_chapter(self, size):
+        """
+        在写入一章之前调用，当前卷放不下这一章时切换到新卷。
+
+        :param size: 这一章（含标题行）的字节数
+        """
+        if self.file and self.chapter_count and (
+            (self.max_chapters and self.chapter_count >= self.max_chapters)
+            or (self.max_bytes and self.written + size > self.max_bytes)
+        ):
+            self._finish_volume()
+        if not self.file:
+            self._open_volume()
+        self.chapter_count += 1
+        self.next_chapter += 1
+
+    def write(self, data):
+        self.file.write(data)
+        self.written += len(data)
+
+    def close(self):
+        """
+        完成最后一卷，并把所有临时文件替换为正式文件。
+
+        :return: 各卷信息列表
+        """
+        if self.file or not self.volumes:
+            self._finish_volume()
+        for volume in self.volumes:
+            os.replace(volume.pop("temp_path"), volume["path"])
+        return self.volumes
+
+    def abort(self):
+        """放弃输出，删除所有临时文件"""
+        if self.file:
+            self.file.close()
+            self.file = None
+        for temp_path in [self.temp_path] + [v.get("temp_path") for v in self.volumes]:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _open_volume(self):
+        path = self.path_for(len(self.volumes) + 1)
+        self.temp_path = path + ".tmp"
+        self.file = open_compressed(self.temp_path, self.compression)
+        self.written = 0
+        self.chapter_count = 0
+
+    def _finish_volume(self):
+        if not self.file:
+            self._open_volume()  # 没有任何章节时也输出一个空文件
+        self.file.close()
+        self.file = None
+        self.volumes.append({
+            "path": self.path_for(len(self.volumes) + 1),
+            "temp_path": self.temp_path,
+            "first_chapter": self.next_chapter - self.chapter_count,
+            "chapter_count": self.chapter_count,
+            "size": self.written,
+        })
+        self.temp_path = None
+
+
+def iter_rendered_novels(novels, part_folder, jobs=None):
+    """
+    按合并顺序依次产出每本小说的渲染结果 (小说, 片段路径, 章节标题列表, 片段字节数)。
+    多进程时最多提前渲染 2 倍进程数的小说，避免输出较慢（例如 xz 压缩）时临时片段堆满磁盘。
+    """
+    def part_path(position):
+        return os.path.join(part_folder, f"{position}.part")
+
+    workers = jobs or os.cpu_count() or 1
+    if workers == 1 or len(novels) < 2:
+        for position, novel in enumerate(novels):
+            yield (novel, part_path(position), *render_novel_part(novel.path, part_path(position)))
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {}
+        submitted = 0
+        for position, novel in enumerate(novels):
+            while submitted < len(novels) and submitted < position + 2 * workers:
+                futures[submitted] = executor.submit(render_novel_part, novels[submitted].path, part_path(submitted))
+                submitted += 1
+            yield (novel, part_path(position), *futures.pop(position).result())
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def volume_manifest_path_for(save_path):
+    """分卷信息文件路径"""
+    return save_path + ".volumes.json"
+
+
+def load_volume_manifest(save_path):
+    """读取上次的分卷信息，不存在或已损坏时返回 None"""
+    try:
+        with open(volume_manifest_path_for(save_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def remove_stale_volumes(save_path, old_manifest, volumes):
+    """删除上次输出、但这次没有再生成的卷（例如分卷数变少或换了压缩格式），避免旧卷看起来仍然有效"""
+    if not old_manifest:
+        return
+    folder = os.path.dirname(os.path.abspath(save_path))
+    current = {os.path.basename(volume["path"]) for volume in volumes}
+    for volume in old_manifest.get("volumes", []):
+        name = os.path.basename(volume.get("path", ""))
+        if name and name not in current:
+            try:
+                os.remove(os.path.join(folder, name))
+            except FileNotFoundError:
+                pass
+
+
+def merge_novel_volumes(novels, save_path, compression=None, max_bytes=None, max_chapters=None, progress=None, jobs=None):
+    """
+    合并小说并直接写出压缩和/或分卷的结果，章节编号在各卷之间连续。
+    各卷信息（文件名、首章编号、章节数）写入 <合并文件>.volumes.json，便于查找某一章所在的卷；
+    上次输出而这次没有生成的卷会被删除。
+    该模式每次完整合并，不复用上次的片段，也不生成按偏移读取的章节目录。
+
+    :param novels: 按合并顺序排列的小说记录
+    :param save_path: 合并结果路径（各卷文件名由此生成）
+    :param compression: None、"gzip"、"bz2"、"xz" 或 "zstd"
+    :param max_bytes: 每卷最大字节数（未压缩）
+    :param max_chapters: 每卷最大章节数
+    :param progress: 进度回调 progress(已完成小说数, 小说总数)，抛出异常可中止合并
+    :param jobs: 并行渲染的工作进程数
+    :return: 各卷信息列表
+    """
+    open_compressed(os.devnull, compression).close()  # 压缩格式不可用时在开始前报错
+    old_manifest = load_volume_manifest(save_path)
+    writer = VolumeWriter(save_path, compression, max_bytes, max_chapters)
+    work_folder = os.path.dirname(os.path.abspath(save_path))
+    part_folder = tempfile.mkdtemp(prefix=".merge-parts-", dir=work_folder)
+    try:
+        for done, (novel, part_path, titles, size) in enumerate(iter_rendered_novels(novels, part_folder, jobs), 1):
+            with open(part_path, "rb") as part:
+                for i, (title, _, body_start) in enumerate(titles):
+                    body_end = titles[i + 1][2] if i + 1 < len(titles) else size
+                    title_line = format_title_line(writer.next_chapter, novel.name, title)
+                    writer.begin_chapter(len(title_line) + body_end - body_start)
+                    writer.write(title_line)
+                    copy_byte_range(part, writer, body_start, body_end - body_start)
+            os.remove(part_path)
+            if progress:
+                progress(done, len(novels))
+        volumes = writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        shutil.rmtree(part_folder, ignore_errors=True)
+
+    manifest = {
+        "compression": compression,
+        "volumes": [dict(volume, path=os.path.basename(volume["path"])) for volume in volumes],
+    }
+    write_json_atomic(volume_manifest_path_for(save_path), manifest, indent=4)
+    remove_stale_volumes(save_path, old_manifest, volumes)
+    return volumes
@@ -0,0 +1,149 @@
+"""
+合并结果的章节目录：合并时在 <合并文件>.toc.json 中记录每章的来源小说和原标题，
+在 <合并文件>.toc.idx 中以定长记录保存每章的字节偏移和长度，按章节编号 O(1) 定位，无需重新扫描合并文件。
+"""
+import os
+import json
+import struct
+
+TOC_VERSION = 1
+TOC_MAGIC = b"NTOC"
+TOC_HEADER = struct.Struct("<4sIIQQ")  # 标识、版本、章节数、合并文件大小、合并文件修改时间（纳秒）
+TOC_RECORD = struct.Struct("<QQI")  # 章节在合并文件中的偏移、长度、来源小说序号
+
+
+def toc_paths_for(save_path):
+    """合并结果对应的目录文件路径：(JSON 目录, 二进制偏移索引)"""
+    return save_path + ".toc.json", save_path + ".toc.idx"
+
+
+def write_toc(save_path, chapters):
+    """
+    根据合并时记录的章节起点写入目录。章节长度为到下一章起点（最后一章为到文件末尾）的字节数。
+
+    :param save_path: 合并文件路径（已写入完成）
+    :param chapters: 按全局编号排列的 (来源小说名, 原章节标题, 章节在合并文件中的偏移)
+    """
+    stat = os.stat(save_path)
+    json_path, idx_path = toc_paths_for(save_path)
+
+    novel_names = []
+    novel_indexes = {}
+    entries = []
+    records = bytearray()
+    for i, (novel_name, title, offset) in enumerate(chapters):
+        if novel_name not in novel_indexes:
+            novel_indexes[novel_name] = len(novel_names)
+            novel_names.append(novel_name)
+        end = chapters[i + 1][2] if i + 1 < len(chapters) else stat.st_size
+        records += TOC_RECORD.pack(offset, end - offset, novel_indexes[novel_name])
+        entries.append([novel_indexes[novel_name], title])
+
+    header = TOC_HEADER.pack(TOC_MAGIC, TOC_VERSION, len(chapters), stat.st_size, stat.st_mtime_ns)
+    with open(idx_path + ".tmp", "wb") as f:
+        f.write(header)
+        f.write(records)
+    os.replace(idx_path + ".tmp", idx_path)
+
+    toc = {
+        "version": TOC_VERSION,
+        "output_size": stat.st_size,
+        "output_mtime_ns": stat.st_mtime_ns,
+        "novels": novel_names,
+        "chapters": entries,  # 第 i 项为第 i+1 章：[来源小说序号, 原章节标题]
+    }
+    with open(json_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(toc, f, ensure_ascii=False)
+    os.replace(json_path + ".tmp", json_path)
+
+
+def load_toc(save_path):
+    """
+    读取完整目录；目录缺失、版本不符或合并文件已被改动时返回 None。
+
+    :return: {"novels", "chapters"（[来源小说序号, 原标题]）, "offsets"（(偏移, 长度)）}
+    """
+    json_path, idx_path = toc_paths_for(save_path)
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            toc = json.load(f)
+        with open(idx_path, "rb") as f:
+            data = f.read()
+        stat = os.stat(save_path)
+    except (OSError, ValueError):
+        return None
+    if toc.get("version") != TOC_VERSION or len(data) < TOC_HEADER.size:
+        return None
+    magic, version, count, output_size, output_mtime_ns = TOC_HEADER.unpack_from(data)
+    if magic != TOC_MAGIC or version != TOC_VERSION or count != len(toc["chapters"]):
+        return None
+    if (output_size, output_mtime_ns) != (stat.st_size, stat.st_mtime_ns) or toc.get("output_size") != stat.st_size:
+        return None
+    toc["offsets"] = [(offset, length) for offset, length, _ in TOC_RECORD.iter_unpack(data[TOC_HEADER.size:])]
+    return toc
+
+
+class MergedChapterReader:
+    """
+    按全局章节编号读取合并文件中的章节：只读取索引头和一条定长记录，再按偏移读取章节本身，
+    耗时与合并文件大小、章节总数无关。
+
+    用法：
+        with MergedChapterReader(save_path) as reader:
+            text = reader.read_chapter(123)
+    """
+
+    def __init__(self, save_path):
+        _, idx_path = toc_paths_for(save_path)
+        self.index = None
+        self.output = open(save_path, "rb")
+        try:
+            self.index = open(idx_path, "rb")
+            magic, version, self.count, output_size, output_mtime_ns = TOC_HEADER.unpack(self.index.read(TOC_HEADER.size))
+            stat = os.fstat(self.output.fileno())
+            if magic != TOC_MAGIC or version != TOC_VERSION:
+                raise ValueError(f"无法识别的章节索引: {idx_path}")
+            if (output_size, output_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                raise ValueError("合并文件在生成索引后已被改动，请重新合并")
+        except BaseException:
+            self.close()
+            raise
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.output.close()
+        if self.index:
+            self.index.close()
+
+    def chapter_span(self, number):
+        """
+        返回第 number 章（从 1 开始）的 (偏移, 长度, 来源小说序号)。
+        """
+        if not 1 <= number <= self.count:
+            raise IndexError(f"章节编号超出范围: {number}（共 {self.count} 章）")
+        self.index.seek(TOC_HEADER.size + (number - 1) * TOC_RECORD.size)
+        return TOC_RECORD.unpack(self.index.read(TOC_RECORD.size))
+
+    def read_chapter_bytes(self, number):
+        """读取第 number 章的原始字节（包含改写后的标题行）"""
+        offset, length, _ = self.chapter_span(number)
+        self.output.seek(offset)
+        return self.output.read(length)
+
+    def read_chapter(self, number):
+        """读取第 number 章的文本"""
+        return self.read_chapter_bytes(number).decode("utf-8", errors="ignore")
+
+
+def read_merged_chapter(save_path, number):
+    """按全局章节编号读取合并文件中的一章（连续读取多章时请使用 MergedChapterReader，避免重复打开文件）"""
+    with MergedChapterReader(save_path) as reader:
+        return reader.read_chapter(number)
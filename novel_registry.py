@@ -0,0 +1,133 @@
+import os
+import threading
+from file_utils import replace_spaces_in_filename
+
+
+def normalize_filename(path):
+    """用于同名匹配的文件名：取文件名部分并把空格替换为 '-'"""
+    return replace_spaces_in_filename(os.path.basename(path))
+
+
+class NovelRecord:
+    """工程中的一本小说"""
+
+    __slots__ = ("name", "path", "md5", "source", "order")
+
+    def __init__(self, name, path, md5=None, source=None, order=0):
+        self.name = name  # 小说名（工程内唯一）
+        self.path = path  # 工程内小说文件路径
+        self.md5 = md5  # 工程内小说文件的 MD5
+        self.source = source  # 外部源文件指纹
+        self.order = order  # 合并顺序
+
+    @classmethod
+    def from_dict(cls, data):
+        """从 project.json 中的条目创建"""
+        return cls(data["name"], data["path"], data.get("md5"), data.get("source"), data.get("order", 0))
+
+    def to_dict(self):
+        """转换为 project.json 中的条目（保留原有的 chapters 字段以兼容旧版本）"""
+        data = {"name": self.name, "path": self.path, "md5": self.md5, "chapters": []}
+        if self.source:
+            data["source"] = self.source
+        if self.order:
+            data["order"] = self.order
+        return data
+
+    def __repr__(self):
+        return f"NovelRecord(name={self.name!r}, path={self.path!r}, md5={self.md5!r})"
+
+
+class NovelRegistry:
+    """
+    小说登记表：按加入顺序保存小说，并维护小说名、规范化文件名和 MD5 三个索引，
+    查找、加入、删除都是 O(1)。修改 path 或 md5 必须通过 update 以保持索引一致。
+    后台导入、同步会在工作线程中修改登记表，修改和 snapshot 都持有 lock，界面线程遍历时应使用 snapshot。
+    snapshot 返回的元组在登记表变化前一直复用，列表刷新、查找时不会每次复制全部小说。
+    """
+
+    def __init__(self, records=()):
+        self.lock = threading.RLock()
+        self._snapshot = ()  # 最近一次 snapshot 的结果
+        self._snapshot_version = -1  # _snapshot 对应的 _version
+        self._version = 0  # 每次加入或移除小说时加一
+        self._by_name = {}  # 小说名 -> 记录（dict 保持加入顺序）
+        self._by_filename = {}  # 规范化文件名 -> 记录
+        self._by_md5 = {}  # MD5 -> {小说名: 记录}
+        for record in records:
+            self.add(record)
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def __iter__(self):
+        """直接遍历内部字典（不复制）；可能与其他线程的修改同时进行时请使用 snapshot"""
+        return iter(self._by_name.values())
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def snapshot(self):
+        """按加入顺序返回当前所有小说的元组（不可变，可在其他线程修改登记表时安全遍历）"""
+        with self.lock:
+            if self._snapshot_version != self._version:
+                self._snapshot = tuple(self._by_name.values())
+                self._snapshot_version = self._version
+            return self._snapshot
+
+    def add(self, record):
+        """加入小说，同名小说已存在时返回 False"""
+        with self.lock:
+            if record.name in self._by_name:
+                return False
+            self._by_name[record.name] = record
+            self._index(record)
+            self._version += 1
+            return True
+
+    def remove(self, name):
+        """按小说名移除，返回被移除的记录（不存在时返回 None）"""
+        with self.lock:
+            record = self._by_name.pop(name, None)
+            if record:
+                self._unindex(record)
+                self._version += 1
+            return record
+
+    def update(self, record, path=None, md5=None):
+        """修改小说的路径或 MD5 并更新索引"""
+        with self.lock:
+            self._unindex(record)
+            if path is not None:
+                record.path = path
+            if md5 is not None:
+                record.md5 = md5
+            self._index(record)
+
+    def get(self, name):
+        """按小说名查找"""
+        return self._by_name.get(name)
+
+    def find_by_filename(self, filename):
+        """按文件名查找（空格替换为 '-' 后比较）"""
+        return self._by_filename.get(normalize_filename(filename))
+
+    def find_by_md5(self, md5):
+        """返回内容 MD5 相同的所有小说"""
+        with self.lock:
+            return list(self._by_md5.get(md5, {}).values())
+
+    def _index(self, record):
+        self._by_filename[normalize_filename(record.path)] = record
+        if record.md5:
+            self._by_md5.setdefault(record.md5, {})[record.name] = record
+
+    def _unindex(self, record):
+        filename = normalize_filename(record.path)
+        if self._by_filename.get(filename) is record:
+            del self._by_filename[filename]
+        same_md5 = self._by_md5.get(record.md5)
+        if same_md5 is not None:
+            same_md5.pop(record.name, None)
+            if not same_md5:
+                del self._by_md5[record.md5]
@@ -1,95 +1,244 @@
 import os
-import json
+import copy
 from file_utils import compute_md5, list_text_files, detect_updates, extract_chapters
+from chapter_index import ChapterIndex
+from search_index import SearchIndex
+from similarity import SignatureStore
+from novel_registry import NovelRecord, NovelRegistry
+from project_store import (
+    JsonProjectStore, SqliteProjectStore, open_project_store, resolve_stored_path, is_project_relative
+)
 
 
 class ProjectManager:
-    def __init__(self, project_path):
+    def __init__(self, project_path, backend=None):
+        """
+        :param project_path: 工程文件夹
+        :param backend: 工程存储类型 "json" 或 "sqlite"，为空时自动识别（已有 project.db 则使用 SQLite）。
+                        指定 "sqlite" 而工程仍是 project.json 时会自动迁移
+        """
         self.project_path = project_path  # 设定工程路径
         self.project_file = os.path.join(project_path, "project.json")  # 工程配置文件路径
-        self.novels = []  # 存储小说信息
+        self.novels = NovelRegistry()  # 存储小说信息（按名称、文件名、MD5 建有索引）
         self.last_viewed = {}  # 存储上次查看的章节
+        self._changed = set()  # 上次保存后新增或修改的小说名
+        self._removed = set()  # 上次保存后移除的小说名
+        self._saved_last_viewed = {}  # 上次保存时的 last_viewed，用于判断是否需要写盘
+
+        migrate = backend == "sqlite" and not os.path.exists(os.path.join(project_path, "project.db"))
+        self.store = open_project_store(project_path, None if migrate else backend)  # 工程存储
+        sqlite_store = self.store if self.store.backend == "sqlite" else None
+        self.chapter_index = ChapterIndex(project_path, store=sqlite_store)  # 章节索引缓存
+        self._search_index = None  # 全文搜索索引，第一次使用时才打开
+        self._signature_store = None  # 近似重复检测的签名，第一次使用时才打开
 
         # 加载工程（注意去掉 `project_path` 参数，因为已经有 `self.project_path`）
         self.load_project()
+        if migrate:
+            self.migrate_to_sqlite()
         self.get_project_root_folder_name()
         
+    @property
+    def search_index(self):
+        """全文搜索索引（search.db），第一次访问时打开"""
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.project_path)
+        return self._search_index
+
+    @property
+    def signature_store(self):
+        """近似重复检测的签名（signatures.db），第一次访问时打开"""
+        if self._signature_store is None:
+            self._signature_store = SignatureStore(self.project_path)
+        return self._signature_store
+
+    def has_signatures(self):
+        """工程是否已有相似度签名数据库（没有时不必打开 signatures.db，以免创建空数据库）"""
+        return self._signature_store is not None or os.path.exists(os.path.join(self.project_path, "signatures.db"))
+
+    def close(self):
+        """写入尚未保存的章节索引，关闭工程存储以及已打开的搜索索引、相似度签名数据库（切换到其他工程或退出前调用）"""
+        self.chapter_index.save()
+        self.store.close()
+        if self._search_index:
+            self._search_index.close()
+            self._search_index = None
+        if self._signature_store:
+            self._signature_store.close()
+            self._signature_store = None
+
     def get_project_root_folder_name(self):
         """获取工程根目录文件夹的名字"""
         return os.path.basename(self.project_path)
+
+    def get_merge_output_path(self):
+        """默认的合并结果路径：工程根目录下以工程文件夹命名的 TXT 文件"""
+        return os.path.join(self.project_path, f"{self.get_project_root_folder_name()}.txt")
+
+    def get_merge_order(self):
+        """按合并顺序返回小说列表"""
+        return sorted(self.get_novels(), key=lambda n: n.order)
         
     def load_project(self):
-        """加载工程信息并自动修正路径"""
-        if not os.path.exists(self.project_file):
+        """
+        加载工程信息。小说路径保存为相对工程根目录的路径，打开时只做字符串转换，
+        不逐本检查文件是否存在（需要时用 find_missing_novels 一次性检查），也不会因打开工程而写盘。
+        """
+        if not self.store.exists():
             return
 
-        with open(self.project_file, "r", encoding="utf-8") as f:
-            project_data = json.load(f)
+        novels, self.last_viewed = self.store.load()
+        self._saved_last_viewed = copy.deepcopy(self.last_viewed)
+        records = []
+        for data in novels:
+            stored_path = data["path"]
+            data["path"] = resolve_stored_path(self.project_path, stored_path)
+            record = NovelRecord.from_dict(data)
+            # 旧版本保存的绝对路径或相对当前目录的路径，在下次保存时改写为相对路径
+            if not is_project_relative(stored_path):
+                self._changed.add(record.name)
+            records.append(record)
+        self.novels = NovelRegistry(records)
 
-        self.novels = project_data.get("novels", [])
-        self.last_viewed = project_data.get("last_viewed", {})
+    def save_project(self):
+        """
+        保存工程的状态，包括小说路径、排序、MD5 以及上次查看章节。
+        没有任何变化时不写盘；SQLite 存储只写入变化的小说。
 
-        # 自动路径修正
-        for novel in self.novels:
-            old_path = novel["path"]
-            
-            # 提取相对novels目录后的路径部分
-            parts = old_path.split("novels" + os.sep)[0]
-            
-            if len(parts) > 1:
-                relative_path = parts
-                #print(f"relative_path:{relative_path}")
-                new_base = os.path.join(self.project_path, "novels")
-                new_path = os.path.join(new_base, os.path.basename(relative_path))
-               
-                
-                # 如果新路径存在则更新
-                if os.path.exists(new_path):
-                    novel["path"] = new_path.replace("\\", "/")  # 统一使用斜杠
-                    
-        # 如果检测到修改则自动保存
-        if any(novel["path"].startswith(self.project_path) for novel in self.novels):
-            self.save_project()
+        :return: 是否写入了工程
+        """
+        if (self.store.exists() and not self._changed and not self._removed
+                and self.last_viewed == self._saved_last_viewed):
+            return False
+        self.store.save(self.get_novels(), self.last_viewed, self._changed, self._removed)
+        self._changed.clear()
+        self._removed.clear()
+        self._saved_last_viewed = copy.deepcopy(self.last_viewed)
+        return True
 
+    def mark_changed(self, novel):
+        """记录小说信息已被直接修改（例如刷新了源文件指纹），下次保存时写入"""
+        self._changed.add(novel.name)
 
-    def save_project(self):
-        """保存工程的状态，包括小说路径、排序、MD5 以及上次查看章节"""
-        project_data = {
-            "novels": self.novels,
-            "last_viewed": self.last_viewed  # 记录用户上次查看的小说和章节
-        }
-        
-        with open(self.project_file, "w", encoding="utf-8") as f:
-            json.dump(project_data, f, ensure_ascii=False, indent=4)
+    def migrate_to_sqlite(self):
+        """把当前工程（project.json 与 chapter_index.json）迁移到 project.db，之后使用 SQLite 存储"""
+        if self.store.backend == "sqlite":
+            return False
+        self.store = SqliteProjectStore(self.project_path)
+        self.store.save(self.get_novels(), self.last_viewed)
+        self._changed.clear()
+        self._removed.clear()
+        self._saved_last_viewed = copy.deepcopy(self.last_viewed)
+        self.chapter_index.attach_store(self.store)
+        return True
 
+    def export_json(self, export_path=None):
+        """
+        以 project.json 格式导出工程，便于拷贝到其他环境或回退到 JSON 存储。
 
-    def add_novel(self, novel_path):
-        """添加小说文件到工程"""
+        :param export_path: 导出文件路径，默认为工程中的 project.json
+        :return: 导出文件路径
+        """
+        export_store = JsonProjectStore(self.project_path)
+        if export_path:
+            export_store.project_file = export_path
+        export_store.save(self.get_novels(), self.last_viewed)
+        return export_store.project_file
+
+
+    def add_novel(self, novel_path, md5=None, source=None, save=True):
+        """
+        添加小说文件到工程
+
+        :param novel_path: 工程内小说文件路径
+        :param md5: 已计算好的 MD5，为空时重新计算
+        :param source: 外部源文件信息（路径和原始字节的 MD5），用于之后的更新检测
+        :param save: 是否立即保存工程（批量导入时由调用方统一保存）
+        """
         novel_name = os.path.basename(novel_path)
-        md5=compute_md5(novel_path)
-        novel_entry = {"name": novel_name, "path": novel_path, "md5": md5, "chapters": []}
+        if md5 is None:
+            md5=compute_md5(novel_path)
+        novel_entry = NovelRecord(novel_name, novel_path, md5, source)
         
-        if novel_entry not in self.novels:
-            self.novels.append(novel_entry)
-            self.save_project()
+        if self.novels.add(novel_entry):
+            self._changed.add(novel_name)
+            if save:
+                self.save_project()
             return True
         return False
 
-    def remove_novel(self, novel_name):
+    def remove_novel(self, novel_name, save=True):
         """从工程中移除小说并删除文件"""
-        removed_novels = [n for n in self.novels if n["name"] == novel_name]
-        self.novels = [n for n in self.novels if n["name"] != novel_name]
+        removed_novel = self.novels.remove(novel_name)
         
-        if removed_novels:
+        if removed_novel:
+            self._changed.discard(novel_name)
+            self._removed.add(novel_name)
+            self._evict_chapter_index(removed_novel.md5)
             try:
-                os.remove(removed_novels[0]["path"])
+                os.remove(removed_novel.path)
             except Exception as e:
                 print(f"文件删除失败: {str(e)}")
             
-            self.save_project()
+            if save:
+                self.save_project()
             return True
         return False
     
+    def update_novel(self, novel, novel_path, md5, source=None, save=True):
+        """更新小说的路径和 MD5，并清除旧版本的章节索引"""
+        old_md5 = novel.md5
+        self.novels.update(novel, path=novel_path, md5=md5)
+        if source:
+            novel.source = source
+        self._changed.add(novel.name)
+        if old_md5 != md5:
+            self._evict_chapter_index(old_md5)
+        if save:
+            self.save_project()
+
+    def find_novel_by_filename(self, filename):
+        """按文件名查找小说（空格替换为 '-' 后比较）"""
+        return self.novels.find_by_filename(filename)
+
+    def get_novel(self, novel_name):
+        """按名称查找小说"""
+        return self.novels.get(novel_name)
+
+    def get_chapters(self, novel, progress=None):
+        """获取小说的章节列表（优先使用章节索引缓存；progress 见 ChapterIndex.get_chapters）"""
+        return self.chapter_index.get_chapters(novel.path, novel.md5, progress)
+
+    def _evict_chapter_index(self, md5):
+        """当没有其他小说使用该 MD5 时移除其章节索引（在 close 或批量操作结束时写盘）、搜索索引和相似度签名"""
+        if md5 and not self.novels.find_by_md5(md5):
+            self.chapter_index.evict(md5)
+            if self._search_index or os.path.exists(os.path.join(self.project_path, "search.db")):
+                self.search_index.remove(md5)
+            if self.has_signatures():
+                self.signature_store.remove(md5)
+
+    def find_missing_novels(self):
+        """
+        返回文件已不存在的小说。novels 文件夹只用一次 os.scandir 列出，不对每本小说单独调用 os.path.exists。
+        """
+        novels_folder = os.path.normpath(os.path.join(self.project_path, "novels"))
+        try:
+            with os.scandir(novels_folder) as entries:
+                present = {entry.name for entry in entries}
+        except OSError:
+            present = set()
+
+        missing = []
+        for novel in self.get_novels():
+            folder, filename = os.path.split(novel.path)
+            if os.path.normpath(folder) == novels_folder:
+                if filename not in present:
+                    missing.append(novel)
+            elif not os.path.exists(novel.path):  # 工程外的文件（旧版本工程）单独检查
+                missing.append(novel)
+        return missing
+
     def get_novels(self):
-        """返回小说列表"""
-        return self.novels
+        """返回小说元组（不可变的快照，后台任务修改工程时界面线程可以安全遍历；登记表未变化时不重新复制）"""
+        return self.novels.snapshot()
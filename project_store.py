@@ -0,0 +1,250 @@
+import os
+import json
+import sqlite3
+import threading
+
+SQLITE_SCHEMA_VERSION = 1
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS novels (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL,
+    md5 TEXT,
+    merge_order INTEGER NOT NULL DEFAULT 0,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS chapter_index (
+    md5 TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    chapters TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chapter_files (
+    path TEXT PRIMARY KEY,
+    md5 TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+"""
+
+
+def to_stored_path(project_path, path):
+    """工程内的文件保存为相对工程根目录的路径（统一使用斜杠），工程外的文件保存绝对路径"""
+    root = os.path.abspath(project_path)
+    full = os.path.abspath(path)
+    if full.startswith(root + os.sep):
+        return full[len(root) + 1:].replace("\\", "/")
+    return full
+
+
+def is_project_relative(stored_path):
+    """判断保存的路径是否为当前格式（相对工程根目录的 novels/ 路径）"""
+    return stored_path.startswith("novels/") and ".." not in stored_path
+
+
+def resolve_stored_path(project_path, stored_path):
+    """
+    把保存的路径转换为实际路径，只做字符串处理，不访问文件系统。
+    兼容旧版本保存的绝对路径或相对当前目录的路径：取最后一个 novels/ 之后的文件名，放到本工程的 novels 文件夹下。
+    """
+    if is_project_relative(stored_path):
+        return os.path.join(project_path, *stored_path.split("/"))
+    parts = stored_path.replace("\\", "/").split("novels/")
+    if len(parts) > 1 and parts[-1]:
+        return os.path.join(project_path, "novels", os.path.basename(parts[-1]))
+    if os.path.isabs(stored_path):
+        return stored_path
+    return os.path.join(project_path, stored_path)
+
+
+def write_json_atomic(path, data, indent=None):
+    """先写临时文件再替换，避免写到一半时崩溃导致文件损坏"""
+    temp_file = path + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+    os.replace(temp_file, path)
+
+
+class JsonProjectStore:
+    """project.json 存储：每次保存都整体重写文件，便于查看和拷贝"""
+
+    backend = "json"
+
+    def __init__(self, project_path):
+        self.project_path = project_path
+        self.project_file = os.path.join(project_path, "project.json")
+
+    def exists(self):
+        return os.path.exists(self.project_file)
+
+    def load(self):
+        """
+        读取工程数据。
+
+        :return: (小说条目 dict 列表（path 为保存的原始路径）, last_viewed)
+        """
+        if not self.exists():
+            return [], {}
+        with open(self.project_file, "r", encoding="utf-8") as f:
+            project_data = json.load(f)
+        return project_data.get("novels", []), project_data.get("last_viewed", {})
+
+    def save(self, novels, last_viewed, changed=None, removed=None):
+        """整体写入工程数据（changed、removed 仅供增量存储使用，这里忽略）"""
+        project_data = {
+            "novels": [self._novel_dict(novel) for novel in novels],
+            "last_viewed": last_viewed  # 记录用户上次查看的小说和章节
+        }
+        write_json_atomic(self.project_file, project_data, indent=4)
+
+    def close(self):
+        pass
+
+    def _novel_dict(self, novel):
+        data = novel.to_dict()
+        data["path"] = to_stored_path(self.project_path, novel.path)
+        return data
+
+
+class SqliteProjectStore:
+    """
+    project.db 存储：小说、源文件指纹、章节索引和 last_viewed 保存在 SQLite 中，
+    每次保存只写入变化的行，并在一个事务中提交，崩溃时不会留下写了一半的工程。
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, project_path):
+        self.project_path = project_path
+        self.db_file = os.path.join(project_path, "project.db")
+        self.lock = threading.RLock()  # 后台任务与界面线程共用同一个连接
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript(SQLITE_SCHEMA)
+            self.conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', ?)", (str(SQLITE_SCHEMA_VERSION),)
+            )
+
+    def exists(self):
+        return True
+
+    def load(self):
+        """
+        读取工程数据。
+
+        :return: (小说条目 dict 列表（path 为保存的原始路径）, last_viewed)
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT name, path, md5, merge_order, source FROM novels ORDER BY id").fetchall()
+            last_viewed = self._get_meta("last_viewed")
+        novels = [
+            {"name": name, "path": path, "md5": md5, "order": order, "source": json.loads(source) if source else None}
+            for name, path, md5, order, source in rows
+        ]
+        return novels, json.loads(last_viewed) if last_viewed else {}
+
+    def save(self, novels, last_viewed, changed=None, removed=None):
+        """
+        在一个事务中写入工程数据。
+
+        :param novels: 全部小说记录（按加入顺序）
+        :param changed: 新增或修改过的小说名集合，为 None 时重写全部小说
+        :param removed: 已移除的小说名集合
+        """
+        with self.lock, self.conn:
+            if changed is None:
+                self.conn.execute("DELETE FROM novels")
+                rows = list(novels)
+            else:
+                if removed:
+                    self.conn.executemany("DELETE FROM novels WHERE name = ?", [(name,) for name in removed])
+                rows = [novel for novel in novels if novel.name in changed]
+            self.conn.executemany(
+                "INSERT INTO novels (name, path, md5, merge_order, source) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET path = excluded.path, md5 = excluded.md5, "
+                "merge_order = excluded.merge_order, source = excluded.source",
+                [self._novel_row(novel) for novel in rows]
+            )
+            self._set_meta("last_viewed", json.dumps(last_viewed, ensure_ascii=False))
+
+    def load_chapter_entry(self, md5):
+        """读取一条章节索引：{"mtime_ns", "size", "chapters"}，不存在时返回 None"""
+        with self.lock:
+            row = self.conn.execute("SELECT mtime_ns, size, chapters FROM chapter_index WHERE md5 = ?", (md5,)).fetchone()
+        if not row:
+            return None
+        return {"mtime_ns": row[0], "size": row[1], "chapters": json.loads(row[2])}
+
+    def load_chapter_file(self, path):
+        """读取小说文件扫描章节时的状态 [md5, mtime_ns, size]，不存在时返回 None"""
+        with self.lock:
+            row = self.conn.execute("SELECT md5, mtime_ns, size FROM chapter_files WHERE path = ?", (path,)).fetchone()
+        return list(row) if row else None
+
+    def save_chapter_index(self, entries, files, changed=None, removed=None, changed_files=None):
+        """
+        在一个事务中写入章节索引。
+
+        :param files: 保存的路径 -> [md5, mtime_ns, size]
+        :param changed: 新增或修改过的 MD5 集合，为 None 时重写全部索引
+        :param removed: 已移除的 MD5 集合（同时删除这些 MD5 的文件状态）
+        :param changed_files: 新增或修改过的文件状态（路径集合）
+        """
+        with self.lock, self.conn:
+            if changed is None:
+                self.conn.execute("DELETE FROM chapter_index")
+                self.conn.execute("DELETE FROM chapter_files")
+                changed = entries.keys()
+                changed_files = files.keys()
+            if removed:
+                self.conn.executemany("DELETE FROM chapter_index WHERE md5 = ?", [(md5,) for md5 in removed])
+                self.conn.executemany("DELETE FROM chapter_files WHERE md5 = ?", [(md5,) for md5 in removed])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chapter_index (md5, mtime_ns, size, chapters) VALUES (?, ?, ?, ?)",
+                [
+                    (md5, entries[md5]["mtime_ns"], entries[md5]["size"], json.dumps(entries[md5]["chapters"], ensure_ascii=False))
+                    for md5 in changed if md5 in entries
+                ]
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chapter_files (path, md5, mtime_ns, size) VALUES (?, ?, ?, ?)",
+                [(path, *files[path]) for path in changed_files or () if path in files]
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _novel_row(self, novel):
+        source = json.dumps(novel.source, ensure_ascii=False) if novel.source else None
+        return novel.name, to_stored_path(self.project_path, novel.path), novel.md5, novel.order, source
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def open_project_store(project_path, backend=None):
+    """
+    打开工程存储。
+
+    :param backend: "json" 或 "sqlite"；为空时已有 project.db 则使用 SQLite，否则使用 project.json
+    :return: JsonProjectStore 或 SqliteProjectStore
+    """
+    if backend is None:
+        backend = "sqlite" if os.path.exists(os.path.join(project_path, "project.db")) else "json"
+    if backend == "sqlite":
+        return SqliteProjectStore(project_path)
+    if backend == "json":
+        return JsonProjectStore(project_path)
+    raise ValueError(f"未知的工程存储类型: {backend}")
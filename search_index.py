@@ -0,0 +1,289 @@
+"""
+全文搜索：以“字 + 相邻双字”为词项的倒排索引，保存在工程文件夹的 search.db（SQLite）中。
+每个词项按小说内容（MD5）记录出现该词项的章节序号，查询时只需对各词项的章节集合求交集，不扫描小说文件；
+小说内容变化时按 MD5 删除旧记录、写入新记录，其余小说不受影响。
+"""
+import os
+import re
+import sys
+import mmap
+import pickle
+import sqlite3
+import threading
+from array import array
+from file_utils import read_chapter, extract_chapters
+from chapter_index import backfill_novels
+
+SEARCH_INDEX_VERSION = 1
+TOKEN_PATTERN = re.compile(r"\S+")  # 词项不跨越空白
+SNIPPET_RADIUS = 30  # 搜索结果摘要中关键词前后保留的字数
+MAX_SQL_VARIABLES = 900  # 单条 SQL 语句最多使用的参数个数（低于旧版 SQLite 的上限 999）
+
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    md5 TEXT NOT NULL UNIQUE,
+    chapter_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    gram TEXT NOT NULL,
+    doc INTEGER NOT NULL,
+    chapters BLOB NOT NULL,
+    PRIMARY KEY (gram, doc)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc);
+"""
+
+
+def _encode_ids(ids):
+    """章节序号数组 -> 小端字节串"""
+    if sys.byteorder == "big":
+        ids.byteswap()
+    return ids.tobytes()
+
+
+def _decode_ids(data):
+    ids = array("I")
+    ids.frombytes(data)
+    if sys.byteorder == "big":
+        ids.byteswap()
+    return ids
+
+
+def text_grams(text):
+    """返回文本中出现的单字和相邻双字集合（忽略空白，英文字母不区分大小写）"""
+    grams = set()
+    for run in TOKEN_PATTERN.findall(text.lower()):
+        grams.update(run)
+        grams.update(map(str.__add__, run, run[1:]))
+    return grams
+
+
+def query_grams(query):
+    """
+    查询词拆分为需要同时命中的词项：长度不小于 2 的片段取相邻双字，单字片段取单字。
+    """
+    grams = set()
+    for run in TOKEN_PATTERN.findall(query.lower()):
+        if len(run) == 1:
+            grams.add(run)
+        else:
+            grams.update(map(str.__add__, run, run[1:]))
+    return grams
+
+
+def chapter_postings(novel_path, chapters):
+    """
+    在工作进程中执行：按字节偏移逐章读取小说，统计每个词项出现在哪些章节。
+
+    :param chapters: 排序后的章节列表（与章节索引相同，序号即章节在列表中的位置）
+    :return: {词项: 章节序号数组的字节串}
+    """
+    postings = {}
+    if os.path.getsize(novel_path) == 0:
+        return postings
+    with open(novel_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i, chapter in enumerate(chapters):
+            text = mm[chapter["offset"]:chapter["end"]].decode("utf-8", errors="ignore")
+            for gram in text_grams(text):
+                ids = postings.get(gram)
+                if ids is None:
+                    postings[gram] = ids = array("I")
+                ids.append(i)
+    return {gram: _encode_ids(ids) for gram, ids in postings.items()}
+
+
+def write_postings_file(novel_path, chapters, postings_path):
+    """计算小说的倒排记录并写入临时文件（导入时由工作进程调用，避免大量结果经进程间传递后堆积在内存中）"""
+    with open(postings_path, "wb") as f:
+        pickle.dump(chapter_postings(novel_path, chapters), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_postings_file(postings_path):
+    with open(postings_path, "rb") as f:
+        return pickle.load(f)
+
+
+class SearchIndex:
+    """工程的全文搜索索引（search.db）"""
+
+    def __init__(self, project_path):
+        self.db_file = os.path.join(project_path, "search.db")
+        self.lock = threading.RLock()  # 后台任务与界面线程共用同一个连接
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript(SEARCH_SCHEMA)
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row and row[0] != str(SEARCH_INDEX_VERSION):  # 词项规则变化时清空旧索引
+                self.conn.execute("DELETE FROM postings")
+                self.conn.execute("DELETE FROM docs")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(SEARCH_INDEX_VERSION),))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def indexed_md5s(self):
+        """已建立索引的小说内容 MD5 集合"""
+        with self.lock:
+            return {md5 for (md5,) in self.conn.execute("SELECT md5 FROM docs")}
+
+    def has(self, md5):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM docs WHERE md5 = ?", (md5,)).fetchone() is not None
+
+    def add(self, md5, postings, chapter_count):
+        """
+        在一个事务中写入一本小说的倒排记录（已存在时先删除旧记录）。
+
+        :param postings: chapter_postings 的返回值
+        """
+        with self.lock, self.conn:
+            self._delete(md5)
+            doc = self.conn.execute(
+                "INSERT INTO docs (md5, chapter_count) VALUES (?, ?)", (md5, chapter_count)
+            ).lastrowid
+            self.conn.executemany(
+                "INSERT INTO postings (gram, doc, chapters) VALUES (?, ?, ?)",
+                ((gram, doc, ids) for gram, ids in postings.items())
+            )
+
+    def remove(self, md5):
+        """删除指定内容的倒排记录"""
+        with self.lock, self.conn:
+            self._delete(md5)
+
+    def _delete(self, md5):
+        row = self.conn.execute("SELECT id FROM docs WHERE md5 = ?", (md5,)).fetchone()
+        if row:
+            self.conn.execute("DELETE FROM postings WHERE doc = ?", row)
+            self.conn.execute("DELETE FROM docs WHERE id = ?", row)
+
+    def candidates(self, query):
+        """
+        返回包含查询词全部词项的章节（不读取小说文件；多字查询词的字序需由调用方核对）。
+
+        :return: 按 MD5、章节序号排序的 [(md5, 章节序号), ...]
+        """
+        grams = query_grams(query)
+        if not grams:
+            return []
+        with self.lock:
+            # 从最少见的词项开始求交集，候选集合尽快缩小
+            counts = {
+                gram: self.conn.execute("SELECT COUNT(*) FROM postings WHERE gram = ?", (gram,)).fetchone()[0]
+                for gram in grams
+            }
+            if not all(counts.values()):
+                return []
+            matches = None  # doc -> 章节序号集合
+            for gram in sorted(grams, key=counts.get):
+                current = {}
+                for doc, data in self._postings(gram, None if matches is None else list(matches)):
+                    chapters = set(_decode_ids(data))
+                    if matches is not None:
+                        chapters &= matches[doc]
+                    if chapters:
+                        current[doc] = chapters
+                matches = current
+                if not matches:
+                    return []
+            md5s = dict(self.conn.execute("SELECT id, md5 FROM docs"))
+        return sorted((md5s[doc], chapter) for doc, chapters in matches.items() for chapter in chapters)
+
+    def _postings(self, gram, docs=None):
+        """
+        读取一个词项的倒排记录。
+
+        :param docs: 只读取这些小说（doc）的记录，为 None 时读取全部；分批查询以免超过 SQLite 的参数个数上限
+        :return: [(doc, 章节序号字节串), ...]
+        """
+        if docs is None:
+            return self.conn.execute("SELECT doc, chapters FROM postings WHERE gram = ?", (gram,)).fetchall()
+        rows = []
+        for start in range(0, len(docs), MAX_SQL_VARIABLES):
+            batch = docs[start:start + MAX_SQL_VARIABLES]
+            placeholders = ",".join("?" * len(batch))
+            rows += self.conn.execute(
+                f"SELECT doc, chapters FROM postings WHERE gram = ? AND doc IN ({placeholders})", [gram, *batch]
+            ).fetchall()
+        return rows
+
+
+def make_snippet(text, query):
+    """截取第一个查询片段附近的文字作为摘要，找不到时返回 None"""
+    lowered = text.lower()
+    positions = []
+    for run in TOKEN_PATTERN.findall(query.lower()):
+        position = lowered.find(run)
+        if position < 0:
+            return None
+        positions.append(position)
+    first = min(positions)
+    start = max(0, first - SNIPPET_RADIUS)
+    return " ".join(text[start:first + SNIPPET_RADIUS * 2].split())
+
+
+def search_project(project_manager, query, limit=100, verify=False):
+    """
+    在工程的所有小说中搜索。
+
+    :param query: 查询词，空白分隔的多个片段需同时出现在同一章中
+    :param limit: 最多返回的结果数
+    :param verify: 是否读取候选章节核对片段确实连续出现并生成摘要；默认只查询索引（多字查询词可能混入字序不符的章节，
+                   摘要为 None），核对时逐章读取，直到凑满 limit 条结果为止
+    :return: [{"novel", "md5", "chapter"（章节序号）, "title", "snippet"}, ...]
+    """
+    results = []
+    chapters_by_md5 = {}
+    for md5, chapter_id in project_manager.search_index.candidates(query):
+        novels = project_manager.novels.find_by_md5(md5)
+        if not novels:
+            continue
+        novel = novels[0]
+        if md5 not in chapters_by_md5:
+            chapters_by_md5[md5] = project_manager.get_chapters(novel)
+        chapters = chapters_by_md5[md5]
+        if chapter_id >= len(chapters):
+            continue
+        chapter = chapters[chapter_id]
+        snippet = None
+        if verify:
+            snippet = make_snippet(read_chapter(novel.path, chapter), query)
+            if snippet is None:
+                continue
+        for same in novels:  # 内容相同的多本小说都列出
+            results.append({"novel": same.name, "md5": md5, "chapter": chapter_id, "title": chapter["title"], "snippet": snippet})
+        if limit and len(results) >= limit:
+            return results[:limit]
+    return results
+
+
+def _novel_postings(novel_path, chapters):
+    """在工作进程中执行：章节索引缺失或过期（chapters 为 None）时先扫描章节，再统计倒排记录"""
+    if chapters is None:
+        chapters = extract_chapters(novel_path)
+    return (chapter_postings(novel_path, chapters), len(chapters)), chapters
+
+
+def build_search_index(project_manager, jobs=None, progress=None, missing=None):
+    """
+    为尚未建立搜索索引的小说（例如在此功能之前导入的小说）并行建立索引，并删除已不属于任何小说的索引。
+
+    :param jobs, progress, missing: 见 chapter_index.backfill_novels
+    :return: 新建立索引的小说数量
+    """
+    index = project_manager.search_index
+    indexed = index.indexed_md5s()
+    for md5 in indexed - {n.md5 for n in project_manager.get_novels()}:
+        index.remove(md5)
+    return backfill_novels(
+        project_manager, lambda novel: novel.md5 not in indexed, _novel_postings,
+        sink=lambda novel, result: index.add(novel.md5, *result), jobs=jobs, progress=progress, missing=missing
+    )
@@ -0,0 +1,314 @@
+"""
+近似重复检测：为每本小说和每个章节计算 MinHash 签名（以去掉空白后的 4 字片段为特征），
+用 LSH 分段（banding）找出候选对，再按签名估计的 Jaccard 相似度确认，整体耗时与数量近似线性。
+签名以 MD5 为键保存在工程文件夹的 signatures.db 中，导入时计算，内容不变的小说无需重新计算。
+"""
+import os
+import sys
+import mmap
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import defaultdict
+from file_utils import extract_chapters
+from chapter_index import backfill_novels
+
+SHINGLE_SIZE = 4  # 特征片段的字数
+NOVEL_BINS = 128  # 小说签名长度
+CHAPTER_BINS = 64  # 章节签名长度
+BAND_ROWS = 4  # LSH 每段的行数：段数 = 签名长度 / 4
+MIN_CHAPTER_CHARS = 50  # 过短的章节不计算签名，避免空章节、只有一句话的章节互相匹配
+DEFAULT_THRESHOLD = 0.8  # 判定为近似重复的相似度
+SIGNATURE_VERSION = 1
+EMPTY = 0xFFFFFFFF + 1  # 空桶标记（大于任何 32 位值）
+
+SIGNATURE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS novel_signatures (
+    md5 TEXT PRIMARY KEY,
+    signature BLOB
+);
+CREATE TABLE IF NOT EXISTS chapter_signatures (
+    md5 TEXT NOT NULL,
+    chapter INTEGER NOT NULL,
+    signature BLOB NOT NULL,
+    PRIMARY KEY (md5, chapter)
+) WITHOUT ROWID;
+"""
+
+
+def shingle_bins(text, bins=NOVEL_BINS):
+    """
+    单次排列 MinHash 的分桶最小值：每个片段只计算一次 64 位哈希，按高位分到 bins 个桶，每桶保留低 32 位的最小值。
+
+    :return: 长度为 bins 的列表，空桶为 EMPTY；文本过短时返回 None
+    """
+    text = "".join(text.split()).lower()
+    if len(text) < SHINGLE_SIZE:
+        return None
+    shift = 64 - (bins.bit_length() - 1)  # bins 必须是 2 的幂
+    mins = [EMPTY] * bins
+    blake2b = hashlib.blake2b
+    for shingle in {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}:
+        h = int.from_bytes(blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        b = h >> shift
+        low = h & 0xFFFFFFFF
+        if low < mins[b]:
+            mins[b] = low
+    return mins
+
+
+def fold_bins(mins):
+    """把 2n 个桶合并为 n 个桶（桶号由哈希高位决定，相邻两个桶正好组成上一级的一个桶）"""
+    return [min(mins[i], mins[i + 1]) for i in range(0, len(mins), 2)]
+
+
+def finish_signature(mins):
+    """
+    空桶从后面（循环）最近的非空桶借值并加上距离偏移（densification），使签名可以逐位比较。
+
+    :return: 小端 32 位整数数组的字节串；全部为空时返回 None
+    """
+    if mins is None or all(m == EMPTY for m in mins):
+        return None
+    size = len(mins)
+    signature = array("I", [0] * size)
+    for i in range(size):
+        distance = 0
+        while mins[(i + distance) % size] == EMPTY:
+            distance += 1
+        signature[i] = (mins[(i + distance) % size] + distance * 0x9E3779B1) & 0xFFFFFFFF
+    if sys.byteorder == "big":
+        signature.byteswap()
+    return signature.tobytes()
+
+
+def signature_similarity(a, b):
+    """签名中相同位置取值相同的比例，即 Jaccard 相似度的估计"""
+    x, y = array("I", a), array("I", b)
+    return sum(1 for p, q in zip(x, y) if p == q) / len(x)
+
+
+def novel_signatures(novel_path, chapters):
+    """
+    在工作进程中执行：按字节偏移逐章读取小说，计算每章和整本小说的签名。
+    整本小说的分桶最小值等于各章分桶最小值逐位取最小，不需要保存整本小说的片段集合。
+
+    :return: (小说签名, [章节签名或 None, ...])
+    """
+    novel_mins = [EMPTY] * NOVEL_BINS
+    chapter_signatures = []
+    if os.path.getsize(novel_path) == 0:
+        return None, [None] * len(chapters)
+    with open(novel_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for chapter in chapters:
+            text = mm[chapter["offset"]:chapter["end"]].decode("utf-8", errors="ignore")
+            mins = shingle_bins(text, NOVEL_BINS)
+            if mins is None:
+                chapter_signatures.append(None)
+                continue
+            novel_mins = [min(p, q) for p, q in zip(novel_mins, mins)]
+            long_enough = len(text) - text.count(" ") >= MIN_CHAPTER_CHARS
+            chapter_signatures.append(finish_signature(fold_bins(mins)) if long_enough else None)
+    return finish_signature(novel_mins), chapter_signatures
+
+
+def lsh_candidates(signatures, rows=BAND_ROWS):
+    """
+    LSH 分段：签名每 rows 个值为一段，任一段完全相同的两项成为候选对。
+
+    :param signatures: {键: 签名}
+    :return: 候选对集合 {(键1, 键2)}，键按出现顺序排列
+    """
+    order = {key: i for i, key in enumerate(signatures)}
+    buckets = defaultdict(list)
+    for key, signature in signatures.items():
+        width = rows * 4
+        for band in range(len(signature) // width):
+            buckets[(band, signature[band * width:(band + 1) * width])].append(key)
+    pairs = set()
+    for keys in buckets.values():
+        for i in range(len(keys)):
+            for j in range(i + 1, len(keys)):
+                a, b = keys[i], keys[j]
+                pairs.add((a, b) if order[a] < order[b] else (b, a))
+    return pairs
+
+
+def similar_pairs(signatures, threshold=DEFAULT_THRESHOLD):
+    """
+    :return: [(键1, 键2, 相似度), ...]，按相似度从高到低排列
+    """
+    pairs = []
+    for a, b in lsh_candidates(signatures):
+        score = signature_similarity(signatures[a], signatures[b])
+        if score >= threshold:
+            pairs.append((a, b, score))
+    pairs.sort(key=lambda pair: -pair[2])
+    return pairs
+
+
+class SignatureStore:
+    """工程的相似度签名（signatures.db）"""
+
+    def __init__(self, project_path):
+        self.db_file = os.path.join(project_path, "signatures.db")
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.executescript(SIGNATURE_SCHEMA)
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row and row[0] != str(SIGNATURE_VERSION):  # 特征规则变化时丢弃旧签名
+                self.conn.execute("DELETE FROM novel_signatures")
+                self.conn.execute("DELETE FROM chapter_signatures")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(SIGNATURE_VERSION),))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def indexed_md5s(self):
+        with self.lock:
+            return {md5 for (md5,) in self.conn.execute("SELECT md5 FROM novel_signatures")}
+
+    def has(self, md5):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM novel_signatures WHERE md5 = ?", (md5,)).fetchone() is not None
+
+    def add(self, md5, novel_signature, chapter_signatures):
+        """在一个事务中写入一本小说及其各章的签名"""
+        with self.lock, self.conn:
+            self._delete(md5)
+            self.conn.execute("INSERT INTO novel_signatures (md5, signature) VALUES (?, ?)", (md5, novel_signature))
+            self.conn.executemany(
+                "INSERT INTO chapter_signatures (md5, chapter, signature) VALUES (?, ?, ?)",
+                [(md5, i, signature) for i, signature in enumerate(chapter_signatures) if signature]
+            )
+
+    def remove(self, md5):
+        with self.lock, self.conn:
+            self._delete(md5)
+
+    def _delete(self, md5):
+        self.conn.execute("DELETE FROM novel_signatures WHERE md5 = ?", (md5,))
+        self.conn.execute("DELETE FROM chapter_signatures WHERE md5 = ?", (md5,))
+
+    def novel_signatures(self, md5s=None):
+        """{md5: 签名}，md5s 不为空时只返回其中的小说"""
+        with self.lock:
+            rows = self.conn.execute("SELECT md5, signature FROM novel_signatures WHERE signature IS NOT NULL").fetchall()
+        return {md5: sig for md5, sig in rows if md5s is None or md5 in md5s}
+
+    def chapter_signatures(self, md5s=None):
+        """{(md5, 章节序号): 签名}"""
+        with self.lock:
+            rows = self.conn.execute("SELECT md5, chapter, signature FROM chapter_signatures").fetchall()
+        return {(md5, chapter): sig for md5, chapter, sig in rows if md5s is None or md5 in md5s}
+
+
+def find_similar_novels(project_manager, novels=None, threshold=DEFAULT_THRESHOLD):
+    """
+    找出近似重复的小说（MD5 相同的小说相似度为 1）。
+
+    :param novels: 参与比较的小说（默认工程中全部小说，按合并顺序）
+    :return: [(小说1, 小说2, 相似度), ...]，小说1 在 novels 中排在小说2 之前；
+             工程还没有签名数据库时只比较 MD5
+    """
+    novels = list(novels if novels is not None else project_manager.get_merge_order())
+    pairs = []
+    first_by_md5 = {}
+    for novel in novels:  # 内容完全相同
+        if novel.md5 in first_by_md5:
+            pairs.append((first_by_md5[novel.md5], novel, 1.0))
+        elif novel.md5:
+            first_by_md5[novel.md5] = novel
+    if not project_manager.has_signatures():
+        return pairs
+    signatures = project_manager.signature_store.novel_signatures(set(first_by_md5))
+    ordered = {md5: signatures[md5] for md5 in first_by_md5 if md5 in signatures}
+    for a, b, score in similar_pairs(ordered, threshold):
+        pairs.append((first_by_md5[a], first_by_md5[b], score))
+    return pairs
+
+
+def find_similar_chapters(project_manager, threshold=DEFAULT_THRESHOLD):
+    """
+    找出近似重复的章节（跨小说或同一小说内）。
+
+    :return: [((小说名, 章节序号), (小说名, 章节序号), 相似度), ...]
+    """
+    names = {}
+    for novel in project_manager.get_merge_order():
+        names.setdefault(novel.md5, novel.name)
+    signatures = project_manager.signature_store.chapter_signatures(set(names))
+    ordered = dict(sorted(signatures.items()))
+    return [
+        ((names[a[0]], a[1]), (names[b[0]], b[1]), score)
+        for a, b, score in similar_pairs(ordered, threshold)
+    ]
+
+
+def filter_duplicate_novels(project_manager, novels, threshold=DEFAULT_THRESHOLD):
+    """
+    合并前去掉近似重复的小说：相互重复（包括经由其他小说间接重复）的小说归为一组，每组只保留合并顺序最靠前的一本。
+
+    :return: (保留的小说列表, [(被跳过的小说, 所在组保留的小说, 该小说与组内其他小说的最高相似度), ...])
+    """
+    position = {novel.name: i for i, novel in enumerate(novels)}
+    parent = {}  # 并查集：小说名 -> 上级小说名，根为组内合并顺序最靠前的小说
+    best = {}  # 小说名 -> 最高相似度
+
+    def find(name):
+        root = name
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while name != root:
+            parent[name], name = root, parent[name]
+        return root
+
+    for a, b, score in find_similar_novels(project_manager, novels, threshold):
+        for name in (a.name, b.name):
+            parent.setdefault(name, name)
+            best[name] = max(best.get(name, 0.0), score)
+        root_a, root_b = find(a.name), find(b.name)
+        if root_a != root_b:
+            first, second = sorted((root_a, root_b), key=position.get)
+            parent[second] = first
+
+    skipped = []
+    for novel in novels:
+        if novel.name in parent:
+            root = find(novel.name)
+            if root != novel.name:
+                skipped.append((novel, novels[position[root]], best[novel.name]))
+    kept = [novel for novel in novels if novel.name not in parent or find(novel.name) == novel.name]
+    return kept, skipped
+
+
+def _novel_signatures(novel_path, chapters):
+    """在工作进程中执行：章节索引缺失或过期（chapters 为 None）时先扫描章节，再计算签名"""
+    if chapters is None:
+        chapters = extract_chapters(novel_path)
+    return novel_signatures(novel_path, chapters), chapters
+
+
+def build_signatures(project_manager, jobs=None, progress=None, missing=None):
+    """
+    为尚未计算签名的小说（例如在此功能之前导入的小说）并行计算签名，并删除已不属于任何小说的签名。
+
+    :param jobs, progress, missing: 见 chapter_index.backfill_novels
+    :return: 新计算签名的小说数量
+    """
+    store = project_manager.signature_store
+    indexed = store.indexed_md5s()
+    for md5 in indexed - {n.md5 for n in project_manager.get_novels()}:
+        store.remove(md5)
+    return backfill_novels(
+        project_manager, lambda novel: novel.md5 not in indexed, _novel_signatures,
+        sink=lambda novel, result: store.add(novel.md5, *result), jobs=jobs, progress=progress, missing=missing
+    )
@@ -0,0 +1,112 @@
+import queue
+import threading
+
+
+class TaskCancelled(Exception):
+    """任务被用户取消"""
+
+
+class Task:
+    """后台任务句柄：工作线程通过 progress 报告进度，界面线程通过 cancel 请求取消"""
+
+    def __init__(self, runner, on_done=None, on_error=None, on_progress=None, on_cancel=None):
+        self.runner = runner
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_cancel = on_cancel
+        self.cancel_event = threading.Event()
+        self.finished = False
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        """请求取消，任务会在下一次报告进度时停止"""
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        """在工作线程中调用：已请求取消时抛出 TaskCancelled"""
+        if self.cancel_event.is_set():
+            raise TaskCancelled()
+
+    def progress(self, done, total):
+        """
+        在工作线程中调用的进度回调，可直接传给 import_novels、merge_novel_files 等函数的 progress 参数。
+        同时也是取消检查点。
+        """
+        self.check_cancelled()
+        self.runner.queue.put(("progress", self, (done, total)))
+
+
+class TaskRunner:
+    """
+    在工作线程中执行耗时操作，结果和进度通过队列交回 Tk 主线程（由 root.after 定时轮询），
+    避免界面在导入、合并时卡死。所有回调都在主线程中执行。
+    """
+
+    def __init__(self, root, poll_interval=50):
+        self.root = root
+        self.poll_interval = poll_interval  # 轮询队列的间隔（毫秒）
+        self.queue = queue.Queue()
+        self._active = 0  # 未结束的任务数，为 0 时停止轮询
+        self._polling = False
+
+    def submit(self, func, *args, on_done=None, on_error=None, on_progress=None, on_cancel=None, **kwargs):
+        """
+        提交后台任务。func 的关键字参数 progress 会被设置为 task.progress。
+
+        :param on_done: 完成回调 on_done(结果)
+        :param on_error: 出错回调 on_error(异常)
+        :param on_progress: 进度回调 on_progress(已完成数, 总数)
+        :param on_cancel: 取消回调 on_cancel()
+        :return: Task
+        """
+        task = Task(self, on_done, on_error, on_progress, on_cancel)
+        kwargs.setdefault("progress", task.progress)
+
+        def worker():
+            try:
+                result = func(*args, **kwargs)
+            except TaskCancelled:
+                self.queue.put(("cancelled", task, None))
+            except Exception as e:
+                self.queue.put(("error", task, e))
+            else:
+                self.queue.put(("done", task, result))
+
+        self._active += 1
+        threading.Thread(target=worker, daemon=True).start()
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_interval, self._poll)
+        return task
+
+    def _poll(self):
+        """在主线程中处理工作线程发来的消息"""
+        try:
+            while True:
+                kind, task, payload = self.queue.get_nowait()
+                self._dispatch(kind, task, payload)
+        except queue.Empty:
+            pass
+        if self._active:
+            self.root.after(self.poll_interval, self._poll)
+        else:
+            self._polling = False
+
+    def _dispatch(self, kind, task, payload):
+        if kind == "progress":
+            if task.on_progress and not task.finished:
+                task.on_progress(*payload)
+            return
+
+        task.finished = True
+        self._active -= 1
+        if kind == "done" and task.on_done:
+            task.on_done(payload)
+        elif kind == "error" and task.on_error:
+            task.on_error(payload)
+        elif kind == "cancelled" and task.on_cancel:
+            task.on_cancel()